@@ -0,0 +1,93 @@
+"""
+Offline crawl benchmark: crawls a synthetic workspace served by the fake Slack API with the same Slacker
+and rate limiter the crawler uses, and reports throughput and rate limit behaviour.
+Messages are discarded unless --db-url is given, then they are streamed to dbservice.
+
+    python -m benchmarks.crawl_benchmark --channels 100 --messages 1000 --workers 4 --enforce-tiers --rate-scale 20
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from benchmarks.fake_slack import add_workspace_arguments, make_fake_slack, start_server
+from common.DBClient import DBClient
+from common.LoggerFactory import create_logger
+from common.Slacker import Slacker
+from common.resilence_library.ratelimiter import SlackRateLimiter
+
+
+async def crawl(slacker: Slacker, db: Optional[DBClient], workers: int, days: float) -> int:
+    channels = await slacker.get_channels_list() or []
+    queue = asyncio.Queue()
+    for channel in channels:
+        queue.put_nowait(channel)
+
+    crawled = 0
+    oldest = datetime.now() - timedelta(days=days)
+
+    async def worker():
+        nonlocal crawled
+        while not queue.empty():
+            ch_id, _ = queue.get_nowait()
+            pages = slacker.iter_channel_messages(ch_id, oldest)
+            if db is not None:
+                async def counted():
+                    nonlocal crawled
+                    async for page in pages:
+                        crawled += len(page)
+                        yield page
+                await db.stream_messages(counted())
+            else:
+                async for page in pages:
+                    crawled += len(page)
+
+    await asyncio.gather(*[worker() for _ in range(min(workers, len(channels)))])
+    return crawled
+
+
+async def main(args: argparse.Namespace) -> None:
+    logger = create_logger("benchmark", logging.WARNING)
+    fake = make_fake_slack(args)
+    print(f"Workspace: {fake.workspace.size}")
+
+    runner = await start_server(fake, port=args.port)
+    SlackRateLimiter.rate_scale = args.rate_scale
+    slacker = Slacker(
+        user_token="xoxp-fake",
+        bot_token="xoxb-fake",
+        logger=logger,
+        async_init=True,
+        thread_concurrency=args.thread_concurrency,
+        base_url=f"http://127.0.0.1:{args.port}/api/"
+    )
+    await slacker.__ainit__(bot_token="xoxb-fake")
+    db = DBClient(db_url=args.db_url, logger=logger) if args.db_url else None
+
+    started = time.monotonic()
+    try:
+        crawled = await crawl(slacker, db, args.workers, args.days)
+    finally:
+        elapsed = time.monotonic() - started
+        if db is not None:
+            await db.close()
+        await runner.cleanup()
+
+    print(f"Crawled {crawled} messages in {elapsed:.2f} seconds ({crawled / elapsed:.1f} messages/s)")
+    print(f"Slack requests: {dict(fake.requests)}")
+    print(f"429 answers: {dict(fake.throttled)}")
+    for method, stats in SlackRateLimiter.metrics().items():
+        print(f"Limiter {method}: {stats}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crawl benchmark against the fake Slack API")
+    add_workspace_arguments(parser)
+    parser.add_argument("--port", type=int, default=8765, help="port of the fake Slack API")
+    parser.add_argument("--workers", type=int, default=4, help="channels crawled concurrently")
+    parser.add_argument("--thread-concurrency", type=int, default=10, help="threads requested concurrently")
+    parser.add_argument("--db-url", default="", help="dbservice host:port to stream messages to (optional)")
+    asyncio.run(main(parser.parse_args()))
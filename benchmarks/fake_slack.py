@@ -0,0 +1,329 @@
+"""
+Local stand-in of Slack Web API for offline load tests and benchmarks.
+
+Serves a synthetic workspace with cursor pagination for conversations.list, conversations.history and
+conversations.replies, plus chat.getPermalink, chat.postMessage, chat.postEphemeral, users.info,
+users.list, views.open and auth.test. Rate limits can be injected randomly and/or enforced per method
+according to Slack tiers, 429 answers carry Retry-After header like the real API.
+
+Run standalone and point services to it with SLACK_API_URL=http://host:port/api/ :
+    python -m benchmarks.fake_slack --channels 100 --messages 1000 --port 8080
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+from common.resilence_library.ratelimiter import TIER_RATES, METHOD_TIERS
+
+WORKSPACE_URL = "https://fake-workspace.slack.com/"
+REACTIONS = ["+1", "heart", "fire", "eyes", "tada", "thinking_face", "-1"]
+
+
+class FakeWorkspace:
+    """
+    Synthetic workspace: channels with messages of the last days, some of them with threads and reactions
+    """
+
+    def __init__(
+            self,
+            channels: int = 50,
+            messages: int = 500,
+            users: int = 200,
+            thread_share: float = 0.2,
+            max_replies: int = 50,
+            days: float = 2,
+            seed: int = 0
+    ):
+        """
+        :param channels: amount of channels
+        :param messages: amount of top-level messages in every channel
+        :param users: amount of users
+        :param thread_share: share of messages with threads
+        :param max_replies: maximal amount of replies in a thread
+        :param days: messages are spread over this amount of the last days
+        :param seed: random seed, the same seed generates the same workspace (timestamps are relative to now)
+        """
+        rnd = random.Random(seed)
+        now = time.time()
+
+        self.users = [
+            {"id": f"U{i:08d}", "name": f"user{i}", "tz_offset": rnd.choice([-18000, 0, 3600, 10800])}
+            for i in range(users)
+        ]
+        self.channels = [
+            {"id": f"C{i:08d}", "name": f"channel-{i}", "is_archived": False, "is_channel": True}
+            for i in range(channels)
+        ]
+        # channel_id -> messages (newest first), (channel_id, thread_ts) -> replies (oldest first)
+        self.messages: Dict[str, List[dict]] = {}
+        self.replies: Dict[tuple, List[dict]] = {}
+
+        for channel in self.channels:
+            ch_id = channel["id"]
+            stamps = sorted((now - rnd.uniform(0, days * 86400) for _ in range(messages)), reverse=True)
+            channel_messages = []
+            for ts in stamps:
+                message = {
+                    "type": "message",
+                    "user": rnd.choice(self.users)["id"],
+                    "ts": f"{ts:.6f}",
+                    "text": "x" * rnd.randint(1, 500),
+                }
+                if rnd.random() < 0.3:
+                    message["reactions"] = [
+                        {"name": name, "count": rnd.randint(1, 20)}
+                        for name in rnd.sample(REACTIONS, rnd.randint(1, 3))
+                    ]
+                if rnd.random() < thread_share:
+                    self.__add_thread(rnd, ch_id, message, now, max_replies)
+                channel_messages.append(message)
+            self.messages[ch_id] = channel_messages
+
+    def __add_thread(self, rnd: random.Random, ch_id: str, message: dict, now: float, max_replies: int) -> None:
+        ts = float(message["ts"])
+        stamps = sorted(rnd.uniform(ts, now) for _ in range(rnd.randint(1, max_replies)))
+        replies = [
+            {"type": "message", "user": rnd.choice(self.users)["id"], "ts": f"{x:.6f}",
+             "thread_ts": message["ts"], "text": "y" * rnd.randint(1, 300)}
+            for x in stamps
+        ]
+        message.update({
+            "thread_ts": message["ts"],
+            "reply_count": len(replies),
+            "reply_users_count": len({x["user"] for x in replies}),
+            "latest_reply": replies[-1]["ts"],
+            "replies": [{"user": x["user"], "ts": x["ts"]} for x in replies],
+        })
+        self.replies[(ch_id, message["ts"])] = replies
+
+    @property
+    def size(self) -> dict:
+        return {
+            "channels": len(self.channels),
+            "messages": sum(len(x) for x in self.messages.values()),
+            "replies": sum(len(x) for x in self.replies.values()),
+        }
+
+
+class FakeSlack:
+    """
+    aiohttp application answering Slack Web API methods from a fake workspace
+    """
+
+    def __init__(
+            self,
+            workspace: FakeWorkspace,
+            rate_limit_probability: float = 0.0,
+            enforce_tiers: bool = False,
+            rate_scale: float = 1.0,
+            retry_after: int = 1,
+            latency: float = 0.0
+    ):
+        """
+        :param workspace: workspace to serve
+        :param rate_limit_probability: probability of random 429 answer for any request
+        :param enforce_tiers: whether to answer 429 when requests per minute of a method exceed its tier limit
+        :param rate_scale: multiplier of tier limits (to make benchmarks faster)
+        :param retry_after: Retry-After value of 429 answers in seconds
+        :param latency: artificial delay of every answer in seconds
+        """
+        self.workspace = workspace
+        self.rate_limit_probability = rate_limit_probability
+        self.enforce_tiers = enforce_tiers
+        self.rate_scale = rate_scale
+        self.retry_after = retry_after
+        self.latency = latency
+
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.throttled: Dict[str, int] = defaultdict(int)
+        self.__windows: Dict[str, deque] = defaultdict(deque)
+        self.__users = {x["id"]: x for x in workspace.users}
+        self.__handlers = {
+            "auth.test": self.auth_test,
+            "conversations.list": self.conversations_list,
+            "conversations.history": self.conversations_history,
+            "conversations.replies": self.conversations_replies,
+            "chat.getPermalink": self.chat_get_permalink,
+            "chat.postMessage": self.chat_post_message,
+            "chat.postEphemeral": self.chat_post_message,
+            "users.info": self.users_info,
+            "users.list": self.users_list,
+            "views.open": self.views_open,
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/api/{method}", self.handle)
+        return app
+
+    def __rate_limited(self, method: str) -> bool:
+        if self.rate_limit_probability and random.random() < self.rate_limit_probability:
+            return True
+        if not self.enforce_tiers:
+            return False
+
+        # sliding window of the last minute
+        now = time.monotonic()
+        window = self.__windows[method]
+        while window and now - window[0] >= 60:
+            window.popleft()
+        if len(window) >= TIER_RATES[METHOD_TIERS.get(method, 3)] * self.rate_scale:
+            return True
+        window.append(now)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.requests[method] += 1
+
+        params = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.__rate_limited(method):
+            self.throttled[method] += 1
+            return web.json_response(
+                {"ok": False, "error": "ratelimited"}, status=429, headers={"Retry-After": str(self.retry_after)}
+            )
+
+        handler = self.__handlers.get(method, None)
+        if handler is None:
+            return web.json_response({"ok": False, "error": "unknown_method"})
+        return web.json_response(handler(params))
+
+    @staticmethod
+    def __page(items: list, params: dict, default_limit: int = 100) -> Tuple[list, dict]:
+        offset = int(params.get("cursor", "") or 0)
+        limit = int(params.get("limit", default_limit) or default_limit)
+        page = items[offset:offset + limit]
+        next_cursor = str(offset + limit) if offset + limit < len(items) else ""
+        return page, {"has_more": bool(next_cursor), "response_metadata": {"next_cursor": next_cursor}}
+
+    @staticmethod
+    def __error(error: str) -> dict:
+        return {"ok": False, "error": error}
+
+    def auth_test(self, params: dict) -> dict:
+        return {"ok": True, "url": WORKSPACE_URL, "team": "fake", "user": "digestbot", "user_id": "UBOT"}
+
+    def conversations_list(self, params: dict) -> dict:
+        page, meta = self.__page(self.workspace.channels, params)
+        return {"ok": True, "channels": page, **meta}
+
+    def conversations_history(self, params: dict) -> dict:
+        messages = self.workspace.messages.get(params.get("channel", ""), None)
+        if messages is None:
+            return self.__error("channel_not_found")
+
+        # as in Slack, bounds are exclusive unless inclusive is set
+        oldest = float(params.get("oldest", 0) or 0)
+        latest = float(params.get("latest", 0) or 0) or float("inf")
+        inclusive = str(params.get("inclusive", "")).lower() in ("1", "true")
+        messages = [
+            x for x in messages
+            if (oldest <= float(x["ts"]) <= latest if inclusive else oldest < float(x["ts"]) < latest)
+        ]
+        page, meta = self.__page(messages, params)
+        return {"ok": True, "messages": page, **meta}
+
+    def conversations_replies(self, params: dict) -> dict:
+        ch_id, ts = params.get("channel", ""), params.get("ts", "")
+        parent = next((x for x in self.workspace.messages.get(ch_id, []) if x["ts"] == ts), None)
+        if parent is None:
+            return self.__error("thread_not_found")
+
+        # the parent message is the first one like in Slack
+        page, meta = self.__page([parent, *self.workspace.replies.get((ch_id, ts), [])], params)
+        return {"ok": True, "messages": page, **meta}
+
+    def chat_get_permalink(self, params: dict) -> dict:
+        ch_id, ts = params.get("channel", ""), params.get("message_ts", "")
+        return {"ok": True, "channel": ch_id, "permalink": f"{WORKSPACE_URL}archives/{ch_id}/p{ts.replace('.', '')}"}
+
+    def chat_post_message(self, params: dict) -> dict:
+        return {"ok": True, "channel": params.get("channel", ""), "ts": f"{time.time():.6f}"}
+
+    def users_info(self, params: dict) -> dict:
+        user = self.__users.get(params.get("user", ""), None)
+        return self.__error("user_not_found") if user is None else {"ok": True, "user": user}
+
+    def users_list(self, params: dict) -> dict:
+        page, meta = self.__page(self.workspace.users, params)
+        return {"ok": True, "members": page, **meta}
+
+    def views_open(self, params: dict) -> dict:
+        return {"ok": True, "view": {"id": "V0"}}
+
+    def stats(self) -> dict:
+        return {"requests": dict(self.requests), "throttled": dict(self.throttled)}
+
+
+async def start_server(fake: FakeSlack, host: str = "127.0.0.1", port: int = 8080) -> web.AppRunner:
+    """
+    Start the fake API in the running event loop
+
+    :return: runner to be cleaned up after the benchmark
+    """
+    runner = web.AppRunner(fake.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_workspace_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--channels", type=int, default=50, help="amount of channels")
+    parser.add_argument("--messages", type=int, default=500, help="top-level messages per channel")
+    parser.add_argument("--users", type=int, default=200, help="amount of users")
+    parser.add_argument("--thread-share", type=float, default=0.2, help="share of messages with threads")
+    parser.add_argument("--max-replies", type=int, default=50, help="maximal amount of replies in a thread")
+    parser.add_argument("--days", type=float, default=1, help="messages are spread over this amount of days")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the workspace")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0, help="probability of random 429")
+    parser.add_argument("--enforce-tiers", action="store_true", help="answer 429 above Slack tier limits")
+    parser.add_argument("--rate-scale", type=float, default=1.0, help="multiplier of tier limits")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of 429 answers in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="delay of every answer in seconds")
+
+
+def make_fake_slack(args: argparse.Namespace) -> FakeSlack:
+    workspace = FakeWorkspace(
+        channels=args.channels,
+        messages=args.messages,
+        users=args.users,
+        thread_share=args.thread_share,
+        max_replies=args.max_replies,
+        days=args.days,
+        seed=args.seed,
+    )
+    return FakeSlack(
+        workspace,
+        rate_limit_probability=args.rate_limit_probability,
+        enforce_tiers=args.enforce_tiers,
+        rate_scale=args.rate_scale,
+        retry_after=args.retry_after,
+        latency=args.latency,
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Fake Slack Web API server")
+    add_workspace_arguments(parser)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    fake = make_fake_slack(args)
+    print(f"Workspace: {fake.workspace.size}, API URL: http://{args.host}:{args.port}/api/")
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
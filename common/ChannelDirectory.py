@@ -0,0 +1,102 @@
+import asyncio
+import time
+from logging import Logger
+from typing import Dict, List, Optional, Tuple
+
+from .Slacker import Slacker
+
+
+class ChannelDirectory:
+    """
+    In-memory directory of workspace channels, refreshed from Slack in background after TTL expiration
+    """
+
+    def __init__(self, slacker: Slacker, logger: Logger, ttl: float = 300, public_only: bool = True):
+        """
+        :param slacker: Slack API wrapper
+        :param logger: logger for refresh errors
+        :param ttl: how many seconds the channel list is considered to be fresh
+        :param public_only: whether to list only public channels
+        """
+        self.slacker = slacker
+        self.logger = logger
+        self.ttl = ttl
+        self.public_only = public_only
+
+        self._channels: List[Tuple[str, str]] = []
+        self._names: Dict[str, str] = {}
+        self._ids: Dict[str, str] = {}
+        self._updated: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def expired(self) -> bool:
+        return self._updated is None or time.monotonic() - self._updated > self.ttl
+
+    async def refresh(self) -> bool:
+        """
+        Request the whole channel list from Slack and replace the directory with it
+
+        :return: whether the directory was updated
+        """
+        channels = await self.slacker.get_channels_list(public_only=self.public_only)
+        if channels is None:
+            self.logger.warning("Couldn't refresh channel directory, previous channel list is used.")
+            return False
+
+        self._channels = channels
+        self._names = {ch_id: name for ch_id, name in channels}
+        self._ids = {name: ch_id for ch_id, name in channels}
+        self._updated = time.monotonic()
+        return True
+
+    def __refresh_in_background(self) -> None:
+        # only one refresh request at a time
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def __ensure_loaded(self) -> None:
+        if self._updated is None:
+            # nothing to serve yet, so the first request waits for Slack
+            self.__refresh_in_background()
+            await asyncio.shield(self._refresh_task)
+        elif self.expired:
+            self.__refresh_in_background()
+
+    async def get_channels(self) -> Optional[List[Tuple[str, str]]]:
+        """
+        :return: List of tuples (channel_id, channel_name) or None if channels were never received
+        """
+        await self.__ensure_loaded()
+        return list(self._channels) if self._updated is not None else None
+
+    async def get_name(self, channel_id: str) -> Optional[str]:
+        await self.__ensure_loaded()
+        return self._names.get(channel_id, None)
+
+    async def get_id(self, channel_name: str) -> Optional[str]:
+        await self.__ensure_loaded()
+        return self._ids.get(channel_name.lstrip("#"), None)
+
+    async def __refresh_loop(self) -> None:
+        while True:
+            self.__refresh_in_background()
+            await asyncio.shield(self._refresh_task)
+            await asyncio.sleep(self.ttl / 2)
+
+    def start(self) -> None:
+        """
+        Start refreshing the directory twice per TTL, so lookups never find it expired and never wait for Slack
+        """
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self.__refresh_loop())
+
+    async def stop(self) -> None:
+        for task in (self._loop_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
@@ -0,0 +1,293 @@
+import asyncio
+import json
+from datetime import datetime
+from logging import Logger
+from typing import Any, List, Optional, AsyncIterable, AsyncGenerator
+
+import aiohttp
+from result import Result, Ok, Err
+
+from .extras import TimerEncoder
+from .models import Message, MessageDelta, Timer, Preset, CrawlState
+
+
+class ServiceClient:
+    """
+    Asynchronous JSON client of internal services with keep-alive connection pool
+    """
+
+    def __init__(self, service_url: str, logger: Logger, pool_size: int = 20, timeout: float = 10):
+        """
+        :param service_url: host:port of the service
+        :param logger: logger for request errors
+        :param pool_size: maximum amount of simultaneously opened connections
+        :param timeout: default timeout of each request in seconds
+        """
+        self.base_url = f"http://{service_url}/"
+        self.logger = logger
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        # session should be created inside of the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+            )
+        return self._session
+
+    @staticmethod
+    def __prepare_params(params: Optional[dict]) -> Optional[dict]:
+        # aiohttp accepts only strings and numbers as query values
+        if params is None:
+            return None
+        return {
+            key: str(value).lower() if isinstance(value, bool) else
+            value if isinstance(value, (str, int, float)) else str(value)
+            for key, value in params.items()
+            if value is not None
+        }
+
+    async def request(
+            self,
+            method: str,
+            path: str,
+            params: Optional[dict] = None,
+            body: Optional[Any] = None,
+            timeout: Optional[float] = None
+    ) -> Result[Any, str]:
+        """
+        Make request to the service
+
+        :param method: HTTP method
+        :param path: path of the route relative to the service root
+        :param params: query parameters
+        :param body: object to be sent as JSON body
+        :param timeout: request timeout in seconds (default timeout is used if None)
+        :return: decoded JSON answer or error description
+        """
+        data = None if body is None else json.dumps(body, cls=TimerEncoder)
+        return await self._send(
+            method, path, params, data, "application/json", aiohttp.ClientTimeout(total=timeout or self.timeout)
+        )
+
+    async def _send(
+            self,
+            method: str,
+            path: str,
+            params: Optional[dict],
+            data: Optional[Any],
+            content_type: str,
+            timeout: aiohttp.ClientTimeout
+    ) -> Result[Any, str]:
+        kwargs = {"params": self.__prepare_params(params)}
+        if data is not None:
+            kwargs["data"] = data
+            kwargs["headers"] = {"Content-Type": content_type}
+
+        try:
+            async with self.__get_session().request(method, self.base_url + path, timeout=timeout, **kwargs) as answer:
+                text = await answer.text()
+                if answer.status != 200:
+                    raise ValueError(str([method, path, params, text]))
+
+            return Ok(json.loads(text) if text else None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            self.logger.exception(e)
+            return Err(str(e) or e.__class__.__name__)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+class DBClient(ServiceClient):
+    """
+    Asynchronous dbservice API wrapper
+    """
+
+    def __init__(self, db_url: str, logger: Logger, pool_size: int = 20, timeout: float = 10):
+        super().__init__(service_url=db_url, logger=logger, pool_size=pool_size, timeout=timeout)
+
+    # messages
+    async def upsert_messages(self, messages: List[Message], timeout: Optional[float] = None) -> Result[None, str]:
+        return await self.request("PUT", "message/", body=[x.dict() for x in messages], timeout=timeout)
+
+    async def stream_messages(
+            self, batches: AsyncIterable[List[Message]], timeout: Optional[float] = None
+    ) -> Result[dict, str]:
+        """
+        Upsert messages as newline-delimited JSON stream, every batch is sent as soon as it's produced
+
+        :param batches: async iterable of message batches
+        :param timeout: timeout of reading the answer in seconds (the whole stream is not limited)
+        :return: dict with amount of written messages or error description
+        """
+
+        async def lines() -> AsyncGenerator[bytes, None]:
+            async for batch in batches:
+                if batch:
+                    yield "".join(json.dumps(x.dict(), cls=TimerEncoder) + "\n" for x in batch).encode("utf-8")
+
+        client_timeout = aiohttp.ClientTimeout(total=None, sock_read=timeout or self.timeout)
+        return await self._send("PUT", "message/stream", None, lines(), "application/x-ndjson", client_timeout)
+
+    async def insert_event_messages(
+            self, messages: List[Message], timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        return await self.request("POST", "message/events", body=[x.dict() for x in messages], timeout=timeout)
+
+    async def apply_message_deltas(
+            self, deltas: List[MessageDelta], timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        return await self.request("PATCH", "message/events", body=[x.dict() for x in deltas], timeout=timeout)
+
+    async def get_linkless_messages(
+            self, limit: int, after: Optional[Message] = None, timeout: Optional[float] = None
+    ) -> Result[List[Message], str]:
+        """
+        Page of messages without links, the newest first
+
+        :param limit: page size
+        :param after: the last message of the previous page, the first page if None
+        """
+        params = {"limit": limit}
+        if after is not None:
+            params["after"] = f"{after.timestamp},{after.channel_id}"
+        answer = await self.request("GET", "message/linkless", params=params, timeout=timeout)
+        return answer.map(lambda x: [Message(**y) for y in x])
+
+    async def update_message_links(
+            self, messages: List[Message], timeout: Optional[float] = None
+    ) -> Result[int, str]:
+        """
+        :return: number of stored messages which links were updated
+        """
+        answer = await self.request("PATCH", "message/links", body=[x.dict() for x in messages], timeout=timeout)
+        return answer.map(lambda x: x["matched"])
+
+    async def get_top_messages(self, params: dict, timeout: Optional[float] = None) -> Result[List[Message], str]:
+        answer = await self.request("GET", "message/top", params=params, timeout=timeout)
+        return answer.map(lambda x: [Message(**y) for y in x])
+
+    # crawl state
+    async def get_crawl_states(self, timeout: Optional[float] = None) -> Result[List[CrawlState], str]:
+        answer = await self.request("GET", "crawl_state/", timeout=timeout)
+        return answer.map(lambda x: [CrawlState(**y) for y in x])
+
+    async def upsert_crawl_states(
+            self, states: List[CrawlState], timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        return await self.request("PUT", "crawl_state/", body=[x.dict() for x in states], timeout=timeout)
+
+    async def register_crawl_channels(
+            self, channel_ids: List[str], timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        return await self.request("PUT", "crawl_state/channels", body=channel_ids, timeout=timeout)
+
+    async def claim_crawl_states(
+            self, owner: str, limit: int, lease_seconds: float, timeout: Optional[float] = None
+    ) -> Result[List[CrawlState], str]:
+        params = {"owner": owner, "limit": limit, "lease_seconds": lease_seconds}
+        answer = await self.request("POST", "crawl_state/claim", params=params, timeout=timeout)
+        return answer.map(lambda x: [CrawlState(**y) for y in x])
+
+    async def heartbeat_crawl_states(
+            self, owner: str, channel_ids: List[str], lease_seconds: float, timeout: Optional[float] = None
+    ) -> Result[List[str], str]:
+        params = {"owner": owner, "lease_seconds": lease_seconds}
+        return await self.request("POST", "crawl_state/heartbeat", params=params, body=channel_ids, timeout=timeout)
+
+    async def release_crawl_states(
+            self, owner: str, states: List[CrawlState], timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        params = {"owner": owner}
+        body = [x.dict() for x in states]
+        return await self.request("POST", "crawl_state/release", params=params, body=body, timeout=timeout)
+
+    # timers
+    async def list_timers(self, username: str, timeout: Optional[float] = None) -> Result[List[Timer], str]:
+        answer = await self.request("GET", "timer/", params={"username": username}, timeout=timeout)
+        return answer.map(lambda x: [Timer(**y) for y in x])
+
+    async def insert_timer(self, timer: Timer, timeout: Optional[float] = None) -> Result[Timer, str]:
+        answer = await self.request("POST", "timer/", body=timer.dict(), timeout=timeout)
+        return answer.map(lambda x: Timer(**x))
+
+    async def remove_timer(self, username: str, timer_name: str, timeout: Optional[float] = None) -> Result[None, str]:
+        params = {"username": username, "timer_name": timer_name}
+        return await self.request("DELETE", "timer/", params=params, timeout=timeout)
+
+    async def check_timer_existence(
+            self, username: str, timer_name: str, timeout: Optional[float] = None
+    ) -> Result[bool, str]:
+        params = {"username": username, "timer_name": timer_name}
+        return await self.request("GET", "timer/exists", params=params, timeout=timeout)
+
+    async def count_timers(self, username: Optional[str] = None, timeout: Optional[float] = None) -> Result[int, str]:
+        return await self.request("GET", "timer/count", params={"username": username}, timeout=timeout)
+
+    async def update_timer_next_start(self, timer: Timer, timeout: Optional[float] = None) -> Result[Timer, str]:
+        answer = await self.request("PATCH", "timer/next_start", body=timer.dict(), timeout=timeout)
+        return answer.map(lambda x: Timer(**x))
+
+    async def get_nearest_timer(
+            self, time_border: datetime, timeout: Optional[float] = None
+    ) -> Result[Optional[Timer], str]:
+        params = {"time_border": time_border.isoformat()}
+        answer = await self.request("GET", "timer/nearest", params=params, timeout=timeout)
+        return answer.map(lambda x: None if x is None else Timer(**x))
+
+    async def get_overdue_timers(
+            self, time_border: datetime, timeout: Optional[float] = None
+    ) -> Result[List[Timer], str]:
+        params = {"time_border": time_border.isoformat()}
+        answer = await self.request("GET", "timer/overdue", params=params, timeout=timeout)
+        return answer.map(lambda x: [Timer(**y) for y in x])
+
+    # presets
+    async def get_presets(
+            self,
+            user_id: Optional[str] = None,
+            include_global: Optional[bool] = None,
+            name: Optional[str] = None,
+            timeout: Optional[float] = None
+    ) -> Result[List[Preset], str]:
+        params = {"user_id": user_id, "include_global": include_global, "name": name}
+        answer = await self.request("GET", "preset/", params=params, timeout=timeout)
+        return answer.map(lambda x: [Preset(**y) for y in x])
+
+    async def add_or_update_preset(
+            self, user_id: str, name: str, channels: List[str], timeout: Optional[float] = None
+    ) -> Result[Preset, str]:
+        params = {"user_id": user_id, "name": name}
+        answer = await self.request("PUT", "preset/", params=params, body=channels, timeout=timeout)
+        return answer.map(lambda x: Preset(**x))
+
+    async def delete_preset(self, user_id: str, name: str, timeout: Optional[float] = None) -> Result[Preset, str]:
+        params = {"user_id": user_id, "name": name}
+        answer = await self.request("DELETE", "preset/", params=params, timeout=timeout)
+        return answer.map(lambda x: Preset(**x))
+
+    async def count_presets(self, timeout: Optional[float] = None) -> Result[int, str]:
+        return await self.request("GET", "preset/count", timeout=timeout)
+
+    # ignore list
+    async def get_ignore_list(self, author_id: str, timeout: Optional[float] = None) -> Result[List[str], str]:
+        return await self.request("GET", "ignore/", params={"author_id": author_id}, timeout=timeout)
+
+    async def add_ignore_entry(
+            self, author_id: str, ignore_id: str, timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        params = {"author_id": author_id, "ignore_id": ignore_id}
+        return await self.request("PUT", "ignore/", params=params, timeout=timeout)
+
+    async def remove_ignore_entry(
+            self, author_id: str, ignore_id: str, timeout: Optional[float] = None
+    ) -> Result[None, str]:
+        params = {"author_id": author_id, "ignore_id": ignore_id}
+        return await self.request("DELETE", "ignore/", params=params, timeout=timeout)
+
+    async def count_ignored(self, timeout: Optional[float] = None) -> Result[int, str]:
+        return await self.request("GET", "ignore/count", timeout=timeout)
@@ -1,5 +1,6 @@
 import time
-from typing import List, Tuple, Optional
+from decimal import Decimal
+from typing import List, Tuple, Optional, AsyncGenerator
 from datetime import datetime, timedelta
 from functools import reduce
 from logging import Logger
@@ -8,9 +9,11 @@ import asyncio
 
 from result import Result
 
-from .models import Message
+from .models import Message, CrawlState
 from .utils import reaction_ranking
-from .resilence_library.retryafter import RetryAfterSlack, RetryAfterError
+from .utils.cache import LRUCache, TTLCache
+from .resilence_library.retryafter import RetryAfterError
+from .resilence_library.ratelimiter import SlackRateLimiter
 
 import slack
 import slack.errors as errors
@@ -21,77 +24,103 @@ class Slacker:
     Slack API wrapper
     """
 
-    def __init__(self, user_token: str, bot_token: str, logger: Logger, async_init: bool = False):
+    def __init__(
+            self,
+            user_token: str,
+            bot_token: str,
+            logger: Logger,
+            async_init: bool = False,
+            thread_concurrency: int = 10,
+            thread_cache_size: int = 10000,
+            user_cache_size: int = 1000,
+            user_cache_ttl: float = 3600,
+            base_url: Optional[str] = None
+    ):
         self.logger = logger
-        self.retry_policy = RetryAfterSlack(repeat=5)
-
-        self.bot_web_client = slack.WebClient(token=bot_token, run_async=True)
-        self.user_web_client = slack.WebClient(token=user_token, run_async=True)
+        self.retry_policy = SlackRateLimiter(repeat=5)
+        self.thread_concurrency = thread_concurrency
+        self.thread_cache = LRUCache(maxsize=thread_cache_size)  # (channel_id, ts) -> (thread version, length)
+        self.user_cache = TTLCache(maxsize=user_cache_size, ttl=user_cache_ttl)  # user_id -> users.info answer
+        self.workspace_url: Optional[str] = None  # e.g. https://workspace.slack.com/, used for permalinks
+        self.permalinks_verified: Optional[bool] = None  # whether local permalinks matched Slack API ones
+
+        # Slack Web API is used by default, base_url allows to point the wrapper to a local stand-in
+        self.client_kwargs = {} if base_url is None else {"base_url": base_url}
+        self.bot_web_client = slack.WebClient(token=bot_token, run_async=True, **self.client_kwargs)
+        self.user_web_client = slack.WebClient(token=user_token, run_async=True, **self.client_kwargs)
 
         if async_init:
             return
 
         try:
             self.bot_web_client.auth_test()
-            ans = slack.WebClient(token=bot_token).auth_test()
+            ans = slack.WebClient(token=bot_token, **self.client_kwargs).auth_test()
             self.user_web_client.auth_test()
         except errors.SlackClientError as e:
             self.logger.exception(e)
             raise
         else:
             self.user_id = ans["user_id"]
+            self.workspace_url = ans.get("url", None)
 
         self.logger.info("Slack API connection successfully established.")
 
     async def __ainit__(self, bot_token: str):
         try:
             await self.bot_web_client.auth_test()
-            ans = await slack.WebClient(token=bot_token, run_async=True).auth_test()
+            ans = await slack.WebClient(token=bot_token, run_async=True, **self.client_kwargs).auth_test()
             await self.user_web_client.auth_test()
         except errors.SlackClientError as e:
             self.logger.exception(e)
             raise
         else:
             self.user_id = ans["user_id"]
+            self.workspace_url = ans.get("url", None)
 
         self.logger.info("Slack API connection successfully established.")
 
     async def get_channels_list(
-            self, exclude_archive: bool = True, public_only: bool = True
+            self, exclude_archive: bool = True, public_only: bool = True, page_size: int = 200
     ) -> Optional[List[Tuple[str, str]]]:
         """
-        Get channel names and IDs
+        Get channel names and IDs, following conversations.list pagination
 
         :param exclude_archive: whether to exclude archived chats
         :param public_only: whether to use private channels
+        :param page_size: amount of channels requested at once (Slack recommends no more than 200)
         :return: List of tuples (channel_id, channel_name) or None if any error
         """
 
         # get channels
         exclude_archive = str(exclude_archive).lower()
         types = "public_channel" if public_only else "public_channel, private_channel"
-
-        try:
-            channels = await self.retry_policy.execute(
-                lambda: self.bot_web_client.conversations_list(
-                    exclude_archive=exclude_archive, types=types, limit=999
+        kws = {"exclude_archive": exclude_archive, "types": types, "limit": page_size}
+
+        ch_info = []
+        while True:
+            try:
+                channels = await self.retry_policy.execute(
+                    lambda: self.bot_web_client.conversations_list(**kws),
+                    method="conversations.list"
                 )
-            )
-        except (RetryAfterError, asyncio.TimeoutError):
-            self.logger.warning("Timeout during get_channel_list request")
-            return None
-        except errors.SlackClientError as e:
-            self.logger.exception(e)
-            return None
+            except (RetryAfterError, asyncio.TimeoutError):
+                self.logger.warning("Timeout during get_channel_list request")
+                return None
+            except errors.SlackClientError as e:
+                self.logger.exception(e)
+                return None
 
-        # get ids
-        ch_info = [(x["id"], x["name"]) for x in channels["channels"]]
+            # get ids
+            ch_info.extend((x["id"], x["name"]) for x in channels["channels"])
 
-        return ch_info
+            cursor = (channels.get("response_metadata") or {}).get("next_cursor", "")
+            if not cursor:
+                return ch_info
+            kws.update({"cursor": cursor})
 
     async def __count_th_len(self, ch_id: str, mes: dict) -> int:
         """
-        Count length of the entire thread (with all replies)
+        Count length of the entire thread (with all replies), following replies pagination
 
         :param ch_id: channel ID
         :param mes: message to be updated
@@ -101,39 +130,58 @@ class Slacker:
         if "replies" not in mes:
             return len(mes.get("text", []))
 
-        try:
-            answer = await self.retry_policy.execute(
-                lambda: self.user_web_client.conversations_replies(
-                    channel=ch_id, ts=mes.get("ts", 0)
+        # thread is not changed since the last request if it has the same latest reply and amount of replies
+        key = (ch_id, mes.get("ts", 0))
+        version = (mes.get("latest_reply", None), mes.get("reply_count", None))
+        cached = self.thread_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        kws = {"channel": ch_id, "ts": mes.get("ts", 0), "limit": 200}
+        sum_length = 0
+        while True:
+            try:
+                answer = await self.retry_policy.execute(
+                    lambda: self.user_web_client.conversations_replies(**kws),
+                    method="conversations.replies"
                 )
+            except (RetryAfterError, asyncio.TimeoutError):
+                self.logger.warning("Timeout during count_thread_length request")
+                return 0
+            except errors.SlackClientError as e:
+                self.logger.exception(e)
+                return 0
+
+            sum_length = reduce(
+                lambda x, y: x + len(y.get("text", 0)), answer.get("messages", []), sum_length
             )
-        except (RetryAfterError, asyncio.TimeoutError):
-            self.logger.warning("Timeout during count_thread_length request")
-            return 0
-        except errors.SlackClientError as e:
-            self.logger.exception(e)
-            return 0
 
-        sum_length = reduce(
-            lambda x, y: x + len(y.get("text", 0)), answer.get("messages", []), 0
-        )
-        return sum_length
+            cursor = (answer.get("response_metadata") or {}).get("next_cursor", "")
+            if not answer.get("has_more", False) or not cursor:
+                self.thread_cache.put(key, (version, sum_length))
+                return sum_length
+            kws.update({"cursor": cursor})
 
     async def _count_thread_lengths(
             self, channel_id: str, messages: List[dict]
     ) -> List[dict]:
         """
-        Update messages with length in chars
+        Update messages with length in chars, requesting at most thread_concurrency threads at once
 
         :param channel_id: channel ID (where message is)
         :param messages: message list
         :return: messages with counted length in chars
         """
 
-        for mess in messages:
-            mess.update(
-                {"char_length": await self.__count_th_len(ch_id=channel_id, mes=mess)}
-            )
+        semaphore = asyncio.Semaphore(self.thread_concurrency)
+
+        async def count(mes: dict) -> int:
+            async with semaphore:
+                return await self.__count_th_len(ch_id=channel_id, mes=mes)
+
+        lengths = await asyncio.gather(*[count(mess) for mess in messages])
+        for mess, length in zip(messages, lengths):
+            mess.update({"char_length": length})
 
         return messages
 
@@ -161,21 +209,33 @@ class Slacker:
                 .replace("@here", "here")
                 )
 
-    async def get_channel_messages(
+    async def iter_channel_messages(
             self,
             channel_id: str,
             oldest: datetime = None,
             latest: datetime = None,
-            limit: int = 100000,
-    ) -> Optional[List[Message]]:
+            page_size: int = 200,
+            state: Optional[CrawlState] = None,
+            changed_only: bool = True,
+    ) -> AsyncGenerator[List[Message], None]:
         """
-        Get list of messages and their statistics from the given channel from _oldest_ until now
+        Iterate over messages and their statistics from the given channel page by page,
+        following Slack's cursor pagination
+
+        If crawl state is given, only messages newer than state.last_ts are requested unless changed_only is False.
+        Replies to older threads are picked up by full crawls (changed_only is False), which request only threads
+        whose latest reply moved since they were counted (see thread cache).
+        The state is advanced to the newest timestamps seen after the last page is successfully received.
 
         :param channel_id: ID of channel in slack workspace
         :param oldest: DateTime of oldest message to be returned (None equals to yesterday)
         :param latest: DateTime of newest message to be returned (None equals to now)
-        :param limit: limit for amount of returned messages
-        :return: List of messages from the channel or None if any error
+        :param page_size: amount of messages requested from Slack per page
+        :param state: crawl state of the channel from the previous crawl
+        :param changed_only: whether to request only messages posted after the previous crawl
+        :return: async generator of message batches (one batch per page)
+        :raises: Slack client, rate limit or timeout error if a page couldn't be received,
+                 so a truncated history is never taken for a complete one (the state is not advanced then)
         """
 
         allowed_subtypes = {"thread_broadcast", "bot_message", "file_share", None}
@@ -184,46 +244,57 @@ class Slacker:
         oldest = oldest or (datetime.now() - timedelta(days=1))
         oldest = int(time.mktime(oldest.utctimetuple()))
 
-        kws = {"channel": channel_id, "oldest": oldest, "limit": limit}
+        kws = {"channel": channel_id, "oldest": oldest, "limit": page_size}
         if latest is not None:
             latest = int(time.mktime(latest.utctimetuple()))
             kws.update({"latest": latest})
 
-        try:
+        if state is not None:
+            newest_ts, newest_reply = Decimal(state.last_ts), Decimal(state.last_reply)
+            if changed_only and newest_ts > oldest:
+                # Slack returns messages strictly newer than oldest, older ones were received by previous crawls
+                kws.update({"oldest": state.last_ts})
+
+        while True:
             answer = await self.retry_policy.execute(
-                lambda: self.user_web_client.conversations_history(**kws)
+                lambda: self.user_web_client.conversations_history(**kws),
+                method="conversations.history"
             )
-        except (RetryAfterError, asyncio.TimeoutError):
-            self.logger.warning("Timeout during get_channel_messages request")
-            return None
-        except errors.SlackClientError as e:
-            self.logger.exception(e)
-            return None
 
-        # TODO: "'has_more': True" handling
-        messages = [
-            x for x in answer["messages"] if x.get("subtype", None) in allowed_subtypes
-        ]
+            messages = [
+                x for x in answer["messages"] if x.get("subtype", None) in allowed_subtypes
+            ]
+
+            if state is not None:
+                newest_ts = max([newest_ts, *(Decimal(x["ts"]) for x in messages)])
+                newest_reply = max([newest_reply, *(Decimal(x.get("latest_reply", 0)) for x in messages)])
+
+            messages = await self._count_thread_lengths(channel_id, messages)
+            messages = self._count_reaction_rate(messages)
+
+            # return only needed statistics
+            yield [
+                Message(
+                    username=x.get("user", "") or x.get("username", ""),
+                    timestamp=x["ts"],
+                    reply_count=x.get("reply_count", 0),
+                    reply_users_count=x.get("reply_users_count", 0),
+                    reactions_rate=x.get("reaction_rate", 0),
+                    thread_length=x.get("char_length", 0),
+                    channel_id=channel_id,
+                    link=None,
+                    thread_ts=x["thread_ts"] if x.get("thread_ts", x["ts"]) != x["ts"] else None,
+                )
+                for x in messages
+            ]
 
-        messages = await self._count_thread_lengths(channel_id, messages)
-        messages = self._count_reaction_rate(messages)
+            cursor = (answer.get("response_metadata") or {}).get("next_cursor", "")
+            if not answer.get("has_more", False) or not cursor:
+                break
+            kws.update({"cursor": cursor})
 
-        # return only needed statistics
-        messages = [
-            Message(
-                username=x.get("user", "") or x.get("username", ""),
-                timestamp=x["ts"],
-                reply_count=x.get("reply_count", 0),
-                reply_users_count=x.get("reply_users_count", 0),
-                reactions_rate=x.get("reaction_rate", 0),
-                thread_length=x.get("char_length", 0),
-                channel_id=channel_id,
-                link=None,
-            )
-            for x in messages
-        ]
-
-        return messages
+        if state is not None:
+            state.last_ts, state.last_reply = str(newest_ts), str(newest_reply)
 
     async def get_permalink(
             self, channel_id: str, message_ts: str
@@ -240,7 +311,8 @@ class Slacker:
             answer = await self.retry_policy.execute(
                 lambda: self.bot_web_client.chat_getPermalink(
                     channel=channel_id, message_ts=message_ts
-                )
+                ),
+                method="chat.getPermalink"
             )
 
             link = answer.get("permalink", "")
@@ -258,17 +330,63 @@ class Slacker:
 
         return Result.Err("")
 
+    def build_permalink(self, channel_id: str, message_ts: str, thread_ts: Optional[str] = None) -> Optional[str]:
+        """
+        Build permalink for given message locally, without Slack API request
+
+        :param channel_id: channel ID where message is located
+        :param message_ts: timestamp (unixtime) of the message
+        :param thread_ts: timestamp of the parent message if the message is a reply
+        :return: permalink or None if workspace URL is unknown
+        """
+
+        if not self.workspace_url:
+            return None
+
+        link = f"{self.workspace_url.rstrip('/')}/archives/{channel_id}/p{message_ts.replace('.', '')}"
+        if thread_ts and thread_ts != message_ts:
+            link += f"?thread_ts={thread_ts}&cid={channel_id}"
+        return link
+
+    async def __verify_permalinks(self, message: Message) -> None:
+        """
+        Compare locally built permalink with the one from Slack API.
+        Until they match, every batch is verified again with its own message, so one unusual message
+        doesn't turn local building off for good
+        """
+
+        answer = await self.get_permalink(message.channel_id, message.timestamp)
+        if answer.is_err():
+            return  # couldn't verify (message deleted, timeout, etc), will try next time
+
+        built = self.build_permalink(message.channel_id, message.timestamp, thread_ts=message.thread_ts)
+        self.permalinks_verified = built == answer.value
+        if not self.permalinks_verified:
+            self.logger.warning(
+                f"Locally built permalink {built} does not match Slack API one {answer.value}, "
+                f"Slack API is used for permalinks until they match."
+            )
+
     async def update_permalinks(self, messages: List[Message]) -> List[Message]:
         """
-        Take messages and return them with permalinks added
+        Take messages and return them with permalinks added.
+        Permalinks are built locally, Slack API is used only for verification, if workspace URL is unknown
+        or if the last verification failed.
 
         :param messages: List of messages to be updated
         :return: List of these messages with added permalinks
         """
 
-        links = await asyncio.gather(
-            *[self.get_permalink(mess.channel_id, mess.timestamp) for mess in messages]
-        )
+        if messages and self.workspace_url and not self.permalinks_verified:
+            await self.__verify_permalinks(messages[0])
+
+        if self.workspace_url and self.permalinks_verified is not False:
+            links = [self.build_permalink(mess.channel_id, mess.timestamp, mess.thread_ts) for mess in messages]
+        else:
+            links = await asyncio.gather(
+                *[self.get_permalink(mess.channel_id, mess.timestamp) for mess in messages]
+            )
+            links = [link.value for link in links]
 
         messages = [
             Message(
@@ -279,7 +397,8 @@ class Slacker:
                 thread_length=mess.thread_length,
                 channel_id=mess.channel_id,
                 reactions_rate=mess.reactions_rate,
-                link=link.value,
+                link=link,
+                thread_ts=mess.thread_ts,
             )
             for mess, link in zip(messages, links)
         ]
@@ -310,12 +429,14 @@ class Slacker:
 
         if not ephemeral:
             post = lambda: self.bot_web_client.chat_postMessage(**params)
+            method = "chat.postMessage"
         else:
             post = lambda: self.bot_web_client.chat_postEphemeral(**params, user=user_id)
+            method = "chat.postEphemeral"
 
         try:
             if text or blocks:
-                await self.retry_policy.execute(post)
+                await self.retry_policy.execute(post, method=method)
         except (RetryAfterError, asyncio.TimeoutError):
             self.logger.warning("Couldn't post to channel due to timeout.")
             return None
@@ -331,8 +452,15 @@ class Slacker:
         :return: dict with user's info from https://api.slack.com/methods/users.info
         """
 
+        user = self.user_cache.get(user_id)
+        if user is not None:
+            return user
+
         try:
-            answer = await self.retry_policy.execute(lambda: self.bot_web_client.users_info(user=user_id))
+            answer = await self.retry_policy.execute(
+                lambda: self.bot_web_client.users_info(user=user_id), method="users.info"
+            )
+            self.user_cache.put(user_id, answer['user'])
             return answer['user']
         except (asyncio.TimeoutError, RetryAfterError):
             self.logger.warning("Couldn't receive user's info.")
@@ -341,6 +469,37 @@ class Slacker:
             self.logger.exception(e)
             return None
 
+    async def prefetch_users(self, page_size: int = 200) -> int:
+        """
+        Fill user cache with all workspace members from users.list
+
+        :param page_size: amount of users requested at once
+        :return: amount of cached users
+        """
+
+        kws = {"limit": page_size}
+        cached = 0
+        while True:
+            try:
+                answer = await self.retry_policy.execute(
+                    lambda: self.bot_web_client.users_list(**kws), method="users.list"
+                )
+            except (asyncio.TimeoutError, RetryAfterError):
+                self.logger.warning("Timeout during users prefetch.")
+                return cached
+            except errors.SlackClientError as e:
+                self.logger.exception(e)
+                return cached
+
+            for user in answer.get("members", []):
+                self.user_cache.put(user["id"], user)
+                cached += 1
+
+            cursor = (answer.get("response_metadata") or {}).get("next_cursor", "")
+            if not cursor:
+                return cached
+            kws.update({"cursor": cursor})
+
     async def open_view(self, trigger_id: str, view: dict):
         """
         Open modal window with given trigger_id and window description
@@ -349,7 +508,7 @@ class Slacker:
         """
         try:
             answer = await self.retry_policy.execute(
-                lambda: self.bot_web_client.views_open(trigger_id=trigger_id, view=view))
+                lambda: self.bot_web_client.views_open(trigger_id=trigger_id, view=view), method="views.open")
             return answer['user']
         except (asyncio.TimeoutError, RetryAfterError):
             self.logger.warning("Couldn't receive user's info.")
@@ -367,7 +526,8 @@ class Slacker:
 
         try:
             answer = await self.retry_policy.execute(
-                lambda: self.bot_web_client.conversations_history(channel=channel_id, oldest=oldest, limit=5)
+                lambda: self.bot_web_client.conversations_history(channel=channel_id, oldest=oldest, limit=5),
+                method="conversations.history"
             )
         except (RetryAfterError, asyncio.TimeoutError):
             self.logger.warning("Timeout during get_im_latest_user_message request")
@@ -6,6 +6,7 @@ from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
 from sentry_sdk.integrations.logging import LoggingIntegration
 from common.LoggerFactory import create_logger as _create_logger
+from common.influx import BufferedInfluxWriter
 
 # sentry.io SDK
 SENTRY_URL = os.getenv("SENTRY_URL", "")
@@ -19,6 +20,17 @@ if SENTRY_URL:
 
 
 # InfluxDB
+def __parse_int(logger: logging.Logger, name: str, default: int) -> int:
+    value = os.getenv(name, str(default))
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(
+            f"Could not parse {name}: {value}, default value {default} is used."
+        )
+        return default
+
+
 def __init_influx():
     token = os.getenv("INFLUX_TOKEN", "")
     config = os.getenv("INFLUX_CONFIG", "")
@@ -26,15 +38,27 @@ def __init_influx():
         org, bucket, url = config.split("%")
         client = InfluxDBClient(url=url, token=token)
         write_api = client.write_api(write_options=SYNCHRONOUS)
-        return lambda record: write_api.write(bucket, org, record)
+        logger = _create_logger("influx", logging.WARNING)
+        writer = BufferedInfluxWriter(
+            write=lambda records: write_api.write(bucket, org, records),
+            logger=logger,
+            max_buffer=__parse_int(logger, "INFLUX_BUFFER_SIZE", 10000),
+            flush_interval=__parse_int(logger, "INFLUX_FLUSH_INTERVAL", 10),
+        )
+        return writer.write, writer.count
     else:
-        return lambda *x, **y: True
+        return (lambda *x, **y: True), (lambda *x, **y: None)
 
 
-INFLUX_API_WRITE = __init_influx()
+# INFLUX_API_WRITE(point or list of points) and INFLUX_API_COUNT(measurement, field, value=1) never block:
+# points are buffered and written in background, counters are summed until the next flush
+INFLUX_API_WRITE, INFLUX_API_COUNT = __init_influx()
 
 __logger = _create_logger(__name__, logging.WARNING)
 
+# Slack Web API URL, can be pointed to a local stand-in (e.g. benchmarks/fake_slack.py), Slack itself if empty
+SLACK_API_URL = os.getenv("SLACK_API_URL", "") or None
+
 __available_log_levels = {
     "debug": logging.DEBUG,
     "info": logging.INFO,
@@ -0,0 +1,107 @@
+import atexit
+import threading
+from collections import deque, defaultdict
+from datetime import datetime
+from logging import Logger
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from influxdb_client import Point
+
+
+class BufferedInfluxWriter:
+    """
+    Non-blocking metrics writer: points are put into a bounded buffer and written in batches by a background thread.
+    Counters are summed in memory and written as one point per field on every flush.
+    Points are dropped (and counted) when the buffer is full or Influx is unavailable, so callers never wait.
+    """
+
+    def __init__(
+            self,
+            write: Callable[[List[Point]], Any],
+            logger: Logger,
+            max_buffer: int = 10000,
+            batch_size: int = 500,
+            flush_interval: float = 10
+    ):
+        """
+        :param write: function writing a list of points to Influx (blocking)
+        :param logger: logger for write errors
+        :param max_buffer: how many points can wait for writing, new points are dropped after that
+        :param batch_size: how many points are written at once
+        :param flush_interval: how often to write buffered points and counters in seconds
+        """
+        self._write = write
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = deque(maxlen=max_buffer)
+        self._counters: Dict[Tuple[str, str], float] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.dropped = 0
+
+    def __ensure_started(self) -> None:
+        # thread is started on the first metric, so importing config doesn't spawn threads
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self.__run, name="influx-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def write(self, record: Union[Point, List[Point]]) -> bool:
+        """
+        Put point(s) into the buffer
+
+        :return: True, points are never written synchronously (for compatibility with write API wrappers)
+        """
+        self.__ensure_started()
+        points = record if isinstance(record, list) else [record]
+        with self._lock:
+            for point in points:
+                if len(self._buffer) == self._buffer.maxlen:
+                    self.dropped += 1
+                else:
+                    self._buffer.append(point)
+        return True
+
+    def count(self, measurement: str, field: str, value: float = 1) -> None:
+        """
+        Add value to the counter, the sum is written as one point on the next flush
+        (integer values keep the field integer, as single points with value 1 used to be written)
+        """
+        self.__ensure_started()
+        with self._lock:
+            self._counters[(measurement, field)] += value
+
+    def flush(self) -> None:
+        with self._lock:
+            points = list(self._buffer)
+            self._buffer.clear()
+            counters, self._counters = self._counters, defaultdict(int)
+            dropped, self.dropped = self.dropped, 0
+
+        now = datetime.utcnow()
+        points.extend(
+            Point(measurement).field(field, value).time(now)
+            for (measurement, field), value in counters.items()
+        )
+        if dropped:
+            points.append(Point("influx_writer").field("dropped_points", dropped).time(now))
+
+        for i in range(0, len(points), self.batch_size):
+            try:
+                self._write(points[i:i + self.batch_size])
+            except Exception as e:
+                # metrics are not worth retrying, the next batches may succeed
+                self.logger.warning(f"Couldn't write {len(points[i:i + self.batch_size])} points to Influx: {e}")
+
+    def __run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
@@ -20,6 +20,19 @@ class Message(BaseModel):
     thread_length: int
     link: Optional[str]
     reactions_rate: float = 0.0
+    thread_ts: Optional[str] = None  # timestamp of the parent message if the message is a thread reply
+
+
+class MessageDelta(BaseModel):
+    """
+    Incremental change of message statistics received from Slack events
+    """
+    channel_id: str
+    timestamp: str
+    reply_count: int = 0  # added replies
+    reply_users_count: Optional[int] = None  # absolute amount of reply users if known
+    thread_length: int = 0  # added chars
+    reactions_rate: float = 0.0  # added (or removed if negative) reactions score
 
 
 class Timer(BaseModel):
@@ -29,3 +42,12 @@ class Timer(BaseModel):
     delta: timedelta
     next_start: datetime
     top_command: str
+
+
+class CrawlState(BaseModel):
+    channel_id: str
+    last_ts: str = "0"
+    last_reply: str = "0"
+    next_crawl: Optional[datetime] = None  # UTC
+    crawl_interval: Optional[int] = None  # seconds
+    last_full_crawl: Optional[datetime] = None  # UTC
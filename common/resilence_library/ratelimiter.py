@@ -0,0 +1,171 @@
+import logging
+import random
+import time
+from asyncio import sleep
+from typing import Callable, TypeVar, Optional, Dict
+
+from slack import errors
+
+from .policy import Policy
+from .retryafter import RetryAfterError
+from ..LoggerFactory import create_logger
+
+T = TypeVar("T")
+
+# requests per minute allowed for each tier, see https://api.slack.com/docs/rate-limits
+TIER_RATES = {1: 1, 2: 20, 3: 50, 4: 100}
+
+# tiers of used Slack API methods, methods not listed here are considered to be tier 3
+METHOD_TIERS = {
+    "auth.test": 4,
+    "chat.getPermalink": 4,
+    "chat.postEphemeral": 4,
+    "chat.postMessage": 4,
+    "conversations.history": 3,
+    "conversations.list": 2,
+    "conversations.replies": 3,
+    "users.info": 4,
+    "users.list": 2,
+    "views.open": 4,
+}
+
+
+class TokenBucket:
+    """
+    Token bucket for one Slack API method, implemented through reservations of the next free time slot,
+    so no locks are needed inside of one event loop
+    """
+
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: nominal amount of requests per minute
+        :param burst: amount of requests allowed to be sent at once
+        """
+        self.nominal_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.waiting = 0  # amount of requests waiting for their time slot
+        self.requests = 0
+        self.throttled = 0  # amount of received 429 answers
+        self._theoretical_arrival = 0.0
+
+    @property
+    def interval(self) -> float:
+        return 60 / self.rate
+
+    def reserve(self) -> float:
+        """
+        Reserve time slot for one request
+
+        :return: how many seconds to wait before sending the request
+        """
+        now = time.monotonic()
+        arrival = max(self._theoretical_arrival, now)
+        self._theoretical_arrival = arrival + self.interval
+        self.requests += 1
+        return max(0.0, arrival - (self.burst - 1) * self.interval - now)
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Halve current rate and block the bucket for retry_after seconds
+        """
+        self.throttled += 1
+        self.rate = max(self.nominal_rate / 8, self.rate / 2)
+        now = time.monotonic()
+        self._theoretical_arrival = max(
+            self._theoretical_arrival, now + retry_after + (self.burst - 1) * self.interval
+        )
+
+    def reward(self) -> None:
+        """
+        Slowly restore the rate after successful request
+        """
+        self.rate = min(self.nominal_rate, self.rate + self.nominal_rate / 20)
+
+
+class SlackRateLimiter(Policy):
+    """
+    Rate limiting policy with token buckets for each Slack API method, shared by all instances in the process.
+    Bucket rates are defined by method tiers and adapted by 429 answers with Retry-After headers.
+    """
+
+    _buckets: Dict[str, TokenBucket] = {}
+    rate_scale = 1.0  # multiplier of tier rates, for benchmarks against a local stand-in with faster limits
+
+    def __init__(self, repeat: int, jitter: float = 0.1):
+        """
+        :param repeat: how many times to try a request
+        :param jitter: maximal random addition to waiting time as a part of bucket's interval
+        """
+        self.repeat = repeat
+        self.jitter = jitter
+        self.logger = create_logger("RateLimit-Policy", logging.INFO)
+
+    @classmethod
+    def get_bucket(cls, method: str) -> TokenBucket:
+        if method not in cls._buckets:
+            rate = TIER_RATES[METHOD_TIERS.get(method, 3)] * cls.rate_scale
+            cls._buckets[method] = TokenBucket(rate=rate, burst=max(1, int(rate // 10)))
+        return cls._buckets[method]
+
+    @classmethod
+    def metrics(cls) -> Dict[str, dict]:
+        """
+        :return: dict of method name -> bucket statistics (queue depth, current rate, requests, throttled)
+        """
+        return {
+            method: {
+                "queue_depth": bucket.waiting,
+                "rate": bucket.rate,
+                "requests": bucket.requests,
+                "throttled": bucket.throttled,
+            }
+            for method, bucket in cls._buckets.items()
+        }
+
+    @staticmethod
+    def __int_or_none(val: str) -> Optional[int]:
+        try:
+            val = int(val)
+        except ValueError:
+            return None
+        else:
+            return val
+
+    async def execute(self, function: Callable[[], T], method: str = "") -> T:
+        """
+        Wait for a free time slot of the method and execute the function, retrying after 429 answers
+
+        :param function: lambda function to be executed
+        :param method: Slack API method name, e.g. conversations.history
+        :return: function result
+        """
+        bucket = self.get_bucket(method)
+
+        for i in range(self.repeat):
+            delay = bucket.reserve()
+            if delay > 0:
+                bucket.waiting += 1
+                try:
+                    await sleep(delay + random.uniform(0, self.jitter * bucket.interval))
+                finally:
+                    bucket.waiting -= 1
+
+            try:
+                result = await function()
+            except errors.SlackApiError as e:
+                response = e.response
+                if response.status_code != 429:
+                    raise
+                retry_value = response.headers.get("Retry-After", "")
+                self.logger.debug(
+                    f"429: Retry-After received for {method}, iteration: {i}, retry timer: {retry_value}"
+                )
+                bucket.penalize(self.__int_or_none(retry_value) or 5)
+            else:
+                bucket.reward()
+                return result
+
+        raise RetryAfterError(
+            f"Rate limit policy failed for {method} after {self.repeat} iterations."
+        )
@@ -0,0 +1,37 @@
+import time
+import unittest
+
+from common.utils.cache import LRUCache, TTLCache
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)  # "b" becomes the least recently used
+
+        cache.put("c", 3)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_zero_size_cache_stores_nothing(self):
+        cache = LRUCache(maxsize=0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("a", 0), 0)
+
+
+class TTLCacheTest(unittest.TestCase):
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=0.05)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIn("a", cache)
+
+        time.sleep(0.06)
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.get("a", 0), 0)
+        self.assertEqual(len(cache), 0)
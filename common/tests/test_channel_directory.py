@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock
+
+from common.ChannelDirectory import ChannelDirectory
+
+
+class FakeSlacker:
+    def __init__(self):
+        self.calls = 0
+        self.channels = [("C1", "general"), ("C2", "random")]
+
+    async def get_channels_list(self, public_only: bool = True):
+        self.calls += 1
+        return list(self.channels)
+
+
+class ChannelDirectoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.slacker = FakeSlacker()
+        self.directory = ChannelDirectory(slacker=self.slacker, logger=MagicMock(), ttl=60)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def test_lookups_served_from_memory(self):
+        async def lookups():
+            return [
+                await self.directory.get_channels(),
+                await self.directory.get_name("C2"),
+                await self.directory.get_id("#general"),
+                await self.directory.get_id("unknown"),
+            ]
+
+        channels, name, ch_id, unknown = self.loop.run_until_complete(lookups())
+        self.assertEqual(channels, [("C1", "general"), ("C2", "random")])
+        self.assertEqual((name, ch_id, unknown), ("random", "C1", None))
+        self.assertEqual(self.slacker.calls, 1)
+
+    def test_expired_directory_refreshed_in_background(self):
+        async def lookups():
+            await self.directory.get_channels()
+            self.directory.ttl = 0
+            self.slacker.channels = [("C3", "new")]
+            stale = await self.directory.get_channels()
+            await asyncio.sleep(0)
+            return stale, await self.directory.get_name("C3")
+
+        stale, name = self.loop.run_until_complete(lookups())
+        self.assertEqual(stale, [("C1", "general"), ("C2", "random")])
+        self.assertEqual(name, "new")
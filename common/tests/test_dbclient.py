@@ -0,0 +1,136 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from common.DBClient import DBClient
+from common.models import Message, Timer
+
+MESSAGE = {
+    "username": "U1",
+    "timestamp": "1612345678.000200",
+    "channel_id": "C1",
+    "reply_count": 3,
+    "reply_users_count": 2,
+    "thread_length": 100,
+    "link": None,
+    "reactions_rate": 1.5,
+}
+
+
+class FakeDBService:
+    """
+    dbservice routes used by the tests, every request is recorded
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.app = web.Application()
+        self.app.router.add_get("/message/top", self.top)
+        self.app.router.add_get("/message/linkless", self.linkless)
+        self.app.router.add_put("/message/stream", self.stream)
+        self.app.router.add_get("/timer/nearest", self.nearest_timer)
+        self.app.router.add_post("/timer/", self.insert_timer)
+        self.app.router.add_get("/ignore/", self.slow)
+        self.app.router.add_get("/preset/count", self.failing)
+
+    async def top(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.query))
+        return web.json_response([MESSAGE])
+
+    async def linkless(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.query))
+        return web.json_response([])
+
+    async def stream(self, request: web.Request) -> web.Response:
+        self.requests.append(request.content_type)
+        lines = (await request.read()).decode().splitlines()
+        return web.json_response({"written": len([json.loads(x) for x in lines])})
+
+    async def nearest_timer(self, request: web.Request) -> web.Response:
+        return web.json_response(None)
+
+    async def insert_timer(self, request: web.Request) -> web.Response:
+        return web.json_response(await request.json())
+
+    async def slow(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(1)
+        return web.json_response([])
+
+    async def failing(self, request: web.Request) -> web.Response:
+        return web.Response(status=500, text="Internal Server Error")
+
+
+class DBClientTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.service = FakeDBService()
+        self.server = TestServer(self.service.app, loop=self.loop)
+        self.loop.run_until_complete(self.server.start_server())
+        self.db = DBClient(db_url=f"{self.server.host}:{self.server.port}", logger=MagicMock(), timeout=0.2)
+
+    def tearDown(self) -> None:
+        self.loop.run_until_complete(self.db.close())
+        self.loop.run_until_complete(self.server.close())
+        self.loop.close()
+
+    def test_answers_converted_to_models(self):
+        answer = self.loop.run_until_complete(self.db.get_top_messages({"user_id": "U1", "top_count": 1}))
+        self.assertTrue(answer.is_ok())
+        self.assertEqual(answer.value, [Message(**MESSAGE)])
+
+    def test_query_parameters_prepared(self):
+        after = Message(**MESSAGE)
+        self.loop.run_until_complete(self.db.get_linkless_messages(limit=10, after=after))
+        self.loop.run_until_complete(self.db.get_linkless_messages(limit=10))
+        self.assertEqual(
+            self.service.requests,
+            [{"limit": "10", "after": "1612345678.000200,C1"}, {"limit": "10"}]
+        )
+
+    def test_null_answer(self):
+        answer = self.loop.run_until_complete(self.db.get_nearest_timer(datetime.utcnow()))
+        self.assertTrue(answer.is_ok())
+        self.assertIsNone(answer.value)
+
+    def test_timer_round_trip(self):
+        timer = Timer(
+            channel_id="C1",
+            username="U1",
+            timer_name="daily",
+            delta=timedelta(days=1),
+            next_start=datetime(2021, 2, 3, 4, 5, 6),
+            top_command="top 10",
+        )
+        answer = self.loop.run_until_complete(self.db.insert_timer(timer))
+        self.assertEqual(answer.value, timer)
+
+    def test_error_status_mapped_to_err(self):
+        answer = self.loop.run_until_complete(self.db.count_presets())
+        self.assertTrue(answer.is_err())
+        self.assertIn("Internal Server Error", answer.value)
+
+    def test_timeout_mapped_to_err(self):
+        answer = self.loop.run_until_complete(self.db.get_ignore_list("U1"))
+        self.assertTrue(answer.is_err())
+        self.assertEqual(answer.value, "TimeoutError")
+
+    def test_connection_error_mapped_to_err(self):
+        db = DBClient(db_url="127.0.0.1:1", logger=MagicMock(), timeout=0.2)
+        answer = self.loop.run_until_complete(db.count_presets())
+        self.loop.run_until_complete(db.close())
+        self.assertTrue(answer.is_err())
+
+    def test_stream_sends_ndjson(self):
+        async def batches():
+            yield [Message(**MESSAGE), Message(**{**MESSAGE, "timestamp": "1612345679.000100"})]
+            yield []
+            yield [Message(**{**MESSAGE, "timestamp": "1612345680.000100"})]
+
+        answer = self.loop.run_until_complete(self.db.stream_messages(batches()))
+        self.assertEqual(answer.value, {"written": 3})
+        self.assertEqual(self.service.requests, ["application/x-ndjson"])
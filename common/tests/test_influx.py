@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock
+
+from influxdb_client import Point
+
+from common.influx import BufferedInfluxWriter
+
+
+class BufferedInfluxWriterTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.batches = []
+        self.writer = BufferedInfluxWriter(
+            write=self.batches.append, logger=MagicMock(), max_buffer=3, batch_size=2, flush_interval=3600
+        )
+
+    def tearDown(self) -> None:
+        self.writer.close()
+
+    def test_points_written_in_batches(self):
+        self.writer.write([Point("m").field("a", 1), Point("m").field("b", 2)])
+        self.writer.write(Point("m").field("c", 3))
+        self.assertEqual(self.batches, [])
+
+        self.writer.flush()
+        self.assertEqual([len(x) for x in self.batches], [2, 1])
+
+    def test_counters_aggregated(self):
+        for _ in range(5):
+            self.writer.count("digestbot", "requests")
+        self.writer.count("digestbot", "timers", 2)
+
+        self.writer.flush()
+        lines = sorted(x.to_line_protocol().split(" ")[1] for x in self.batches[0])
+        self.assertEqual(lines, ["requests=5i", "timers=2i"])
+
+    def test_points_dropped_when_buffer_is_full(self):
+        self.writer.write([Point("m").field("x", i) for i in range(5)])
+        self.assertEqual(self.writer.dropped, 2)
+
+        self.writer.flush()
+        points = [x for batch in self.batches for x in batch]
+        self.assertEqual(len(points), 4)
+        self.assertIn("dropped_points=2i", points[-1].to_line_protocol())
+        self.assertEqual(self.writer.dropped, 0)
+
+    def test_write_errors_do_not_propagate(self):
+        self.writer._write = MagicMock(side_effect=ConnectionError("unavailable"))
+        self.writer.write(Point("m").field("x", 1))
+        self.writer.flush()
+        self.writer.logger.warning.assert_called_once()
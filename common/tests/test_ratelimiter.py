@@ -0,0 +1,49 @@
+import unittest
+from slack.errors import SlackApiError
+import asyncio
+from common.resilence_library.ratelimiter import TokenBucket, SlackRateLimiter
+from common.resilence_library.retryafter import RetryAfterError
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_burst_then_spacing(self):
+        bucket = TokenBucket(rate=60, burst=3)
+        delays = [bucket.reserve() for _ in range(5)]
+
+        self.assertEqual(delays[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(delays[3], 1.0, places=2)
+        self.assertAlmostEqual(delays[4], 2.0, places=2)
+
+    def test_penalize_blocks_and_slows_down(self):
+        bucket = TokenBucket(rate=60, burst=3)
+        bucket.penalize(10)
+
+        self.assertEqual(bucket.rate, 30)
+        self.assertAlmostEqual(bucket.reserve(), 10.0, places=2)
+
+        for _ in range(20):
+            bucket.reward()
+        self.assertEqual(bucket.rate, 60)
+
+
+class SlackRateLimiterTest(unittest.TestCase):
+    class Response:
+        status_code = 429
+        headers = {"Retry-After": "1"}
+
+    def test_policy_fails_after_repeats(self):
+        async def call():
+            raise SlackApiError(message="x", response=self.Response())
+
+        policy = SlackRateLimiter(2)
+
+        loop = asyncio.new_event_loop()
+        with self.assertRaises(RetryAfterError):
+            loop.run_until_complete(policy.execute(call, method="test.failing"))
+        self.assertEqual(SlackRateLimiter.metrics()["test.failing"]["throttled"], 2)
+
+    def test_buckets_shared_between_instances(self):
+        self.assertIs(
+            SlackRateLimiter(1).get_bucket("conversations.history"),
+            SlackRateLimiter(1).get_bucket("conversations.history")
+        )
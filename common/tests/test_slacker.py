@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+import unittest
+from typing import List, Union
+
+from slack.errors import SlackApiError
+
+from common.Slacker import Slacker
+from common.models import CrawlState, Message
+
+
+class PermalinkTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.slacker = Slacker(user_token="", bot_token="", logger=logging.getLogger(), async_init=True)
+
+    def test_no_permalink_without_workspace_url(self):
+        self.assertIsNone(self.slacker.build_permalink("C0123", "1612345678.000200"))
+
+    def test_message_permalink(self):
+        self.slacker.workspace_url = "https://example.slack.com/"
+        self.assertEqual(
+            self.slacker.build_permalink("C0123", "1612345678.000200"),
+            "https://example.slack.com/archives/C0123/p1612345678000200"
+        )
+
+    def test_reply_permalink(self):
+        self.slacker.workspace_url = "https://example.slack.com/"
+        self.assertEqual(
+            self.slacker.build_permalink("C0123", "1612345678.000200", thread_ts="1612345600.000100"),
+            "https://example.slack.com/archives/C0123/p1612345678000200?thread_ts=1612345600.000100&cid=C0123"
+        )
+
+
+class FakeRetryPolicy:
+    async def execute(self, function, method=""):
+        return await function()
+
+
+class FakeWebClient:
+    """
+    conversations.history pages, an exception in place of a page is raised when the page is requested.
+    Every thread has one page of replies.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        self.replies_requests = []
+
+    async def conversations_history(self, **kws):
+        self.requests.append(kws)
+        page = self.pages[len(self.requests) - 1]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+    async def conversations_replies(self, **kws):
+        self.replies_requests.append(kws["ts"])
+        return {"messages": [{"ts": kws["ts"], "text": "parent"}, {"text": "reply"}], "has_more": False}
+
+
+class ChannelHistoryTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.slacker = Slacker(user_token="", bot_token="", logger=logging.getLogger(), async_init=True)
+        self.slacker.retry_policy = FakeRetryPolicy()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    @staticmethod
+    def page(*messages: Union[str, dict], cursor: str = "") -> dict:
+        """
+        :param messages: timestamps of messages or messages
+        """
+        return {
+            "messages": [
+                {"ts": x, "user": "U1", "text": "text"} if isinstance(x, str) else {"user": "U1", "text": "text", **x}
+                for x in messages
+            ],
+            "has_more": bool(cursor),
+            "response_metadata": {"next_cursor": cursor},
+        }
+
+    @staticmethod
+    def thread(ts: str, latest_reply: str) -> dict:
+        return {"ts": ts, "replies": [{}], "reply_count": 1, "latest_reply": latest_reply}
+
+    def collect(self, state=None, changed_only: bool = True):
+        async def pages():
+            return [
+                page async for page in self.slacker.iter_channel_messages("C1", state=state, changed_only=changed_only)
+            ]
+
+        return self.loop.run_until_complete(pages())
+
+    def test_incremental_crawl_requests_only_new_messages(self):
+        last_ts = f"{time.time() - 3600:.6f}"
+        newer_ts = f"{time.time() - 60:.6f}"
+        self.slacker.user_web_client = FakeWebClient([self.page(self.thread(newer_ts, newer_ts))])
+        state = CrawlState(channel_id="C1", last_ts=last_ts, last_reply=last_ts)
+
+        pages = self.collect(state)
+        self.assertEqual(self.slacker.user_web_client.requests[0]["oldest"], last_ts)
+        self.assertEqual([x.timestamp for x in pages[0]], [newer_ts])
+        self.assertEqual((state.last_ts, state.last_reply), (newer_ts, newer_ts))
+
+    def test_full_crawl_requests_the_whole_window(self):
+        last_ts = f"{time.time() - 3600:.6f}"
+        self.slacker.user_web_client = FakeWebClient([self.page(last_ts)])
+        state = CrawlState(channel_id="C1", last_ts=last_ts, last_reply="0")
+
+        self.collect(state, changed_only=False)
+        window_start = self.slacker.user_web_client.requests[0]["oldest"]
+        self.assertLess(window_start, float(last_ts))
+        self.assertEqual((state.last_ts, state.last_reply), (last_ts, "0"))
+
+    def test_mark_before_the_window_is_not_used(self):
+        self.slacker.user_web_client = FakeWebClient([self.page()])
+        state = CrawlState(channel_id="C1", last_ts="100.000000", last_reply="0")
+
+        self.collect(state)
+        self.assertGreater(self.slacker.user_web_client.requests[0]["oldest"], 100)
+        self.assertEqual(state.last_ts, "100.000000")
+
+    def test_only_moved_threads_are_requested_again(self):
+        ts = f"{time.time() - 7200:.6f}", f"{time.time() - 3600:.6f}"
+        reply = f"{time.time() - 60:.6f}"
+        self.slacker.user_web_client = FakeWebClient([
+            self.page(self.thread(ts[0], ts[0]), self.thread(ts[1], ts[1])),
+            self.page(self.thread(ts[0], ts[0]), self.thread(ts[1], reply)),
+        ])
+        state = CrawlState(channel_id="C1")
+
+        self.collect(state, changed_only=False)
+        self.collect(state, changed_only=False)
+        self.assertEqual(self.slacker.user_web_client.replies_requests, [ts[0], ts[1], ts[1]])
+        self.assertEqual(state.last_reply, reply)
+
+    def test_pages_are_followed(self):
+        self.slacker.user_web_client = FakeWebClient([self.page("3.0", "2.0", cursor="next"), self.page("1.0")])
+        pages = self.collect()
+        self.assertEqual([[x.timestamp for x in page] for page in pages], [["3.0", "2.0"], ["1.0"]])
+        self.assertEqual(self.slacker.user_web_client.requests[1]["cursor"], "next")
+
+    def test_broadcast_reply_keeps_its_thread(self):
+        self.slacker.user_web_client = FakeWebClient([self.page({"ts": "2.0", "thread_ts": "1.0"}, "1.0")])
+        pages = self.collect()
+        self.assertEqual([x.thread_ts for x in pages[0]], ["1.0", None])
+
+    def test_error_in_the_middle_is_raised(self):
+        error = SlackApiError(message="internal_error", response={"ok": False, "error": "internal_error"})
+        self.slacker.user_web_client = FakeWebClient([self.page("3.0", "2.0", cursor="next"), error])
+        state = CrawlState(channel_id="C1", last_ts="1.0", last_reply="0")
+        with self.assertRaises(SlackApiError):
+            self.collect(state)
+        self.assertEqual((state.last_ts, state.last_reply), ("1.0", "0"))
+
+
+class FakePermalinkClient:
+    """
+    chat.getPermalink answers of the workspace, messages of moved_channel are answered with links to another channel
+    """
+
+    def __init__(self, workspace_url: str, moved_channel: str = ""):
+        self.workspace_url = workspace_url
+        self.moved_channel = moved_channel
+        self.requests = 0
+
+    async def chat_getPermalink(self, channel: str, message_ts: str):
+        self.requests += 1
+        channel = "C_NEW" if channel == self.moved_channel else channel
+        return {"permalink": f"{self.workspace_url}archives/{channel}/p{message_ts.replace('.', '')}"}
+
+
+class PermalinkUpdateTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.slacker = Slacker(user_token="", bot_token="", logger=logging.getLogger(), async_init=True)
+        self.slacker.retry_policy = FakeRetryPolicy()
+        self.slacker.workspace_url = "https://example.slack.com/"
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    @staticmethod
+    def message(channel_id: str, ts: str, thread_ts: str = None) -> Message:
+        return Message(
+            username="U1", timestamp=ts, channel_id=channel_id, reply_count=0, reply_users_count=0,
+            thread_length=1, link=None, thread_ts=thread_ts
+        )
+
+    def update(self, *messages: Message) -> List[str]:
+        return [x.link for x in self.loop.run_until_complete(self.slacker.update_permalinks(list(messages)))]
+
+    def test_reply_permalinks_built_with_thread(self):
+        self.slacker.bot_web_client = FakePermalinkClient("https://example.slack.com/")
+        self.slacker.permalinks_verified = True
+        links = self.update(self.message("C1", "2.000200", thread_ts="1.000100"), self.message("C1", "3.000300"))
+        self.assertEqual(links, [
+            "https://example.slack.com/archives/C1/p2000200?thread_ts=1.000100&cid=C1",
+            "https://example.slack.com/archives/C1/p3000300",
+        ])
+
+    def test_failed_verification_is_repeated(self):
+        client = FakePermalinkClient("https://example.slack.com/", moved_channel="C_OLD")
+        self.slacker.bot_web_client = client
+
+        # the sample doesn't match, the whole batch is served by Slack API
+        links = self.update(self.message("C_OLD", "1.000100"), self.message("C1", "2.000200"))
+        self.assertEqual(links, [
+            "https://example.slack.com/archives/C_NEW/p1000100",
+            "https://example.slack.com/archives/C1/p2000200",
+        ])
+        self.assertEqual(client.requests, 3)
+
+        # the next batch is verified with its own sample and built locally
+        links = self.update(self.message("C1", "3.000300"), self.message("C1", "4.000400"))
+        self.assertEqual(links, [
+            "https://example.slack.com/archives/C1/p3000300",
+            "https://example.slack.com/archives/C1/p4000400",
+        ])
+        self.assertEqual(client.requests, 4)
+
+        self.update(self.message("C1", "5.000500"))
+        self.assertEqual(client.requests, 4)
+        self.assertEqual(self.slacker.workspace_url, "https://example.slack.com/")
@@ -3,6 +3,7 @@ Parse configuration variables from env vars and raise Exceptions if needed
 """
 
 import os
+import socket
 import logging
 from common.LoggerFactory import create_logger as _create_logger
 from common.config import *
@@ -19,7 +20,7 @@ SLACK_BOT_TOKEN = os.getenv("SLACK_BOT_TOKEN", None)
 if SLACK_BOT_TOKEN is None:
     raise Exception("SLACK_BOT_TOKEN is not provided.")
 
-# How often to crawl messages from chats
+# Initial crawl interval of a channel and how often to refresh the channel list (in seconds)
 CRAWL_INTERVAL = os.getenv("CRAWL_INTERVAL", "900")
 try:
     CRAWL_INTERVAL = int(CRAWL_INTERVAL)
@@ -29,6 +30,30 @@ except ValueError:
     )
     CRAWL_INTERVAL = 900
 
+# Crawl interval of a channel is adapted to its activity within these bounds (in seconds)
+CRAWL_MIN_INTERVAL = os.getenv("CRAWL_MIN_INTERVAL", "60")
+try:
+    CRAWL_MIN_INTERVAL = int(CRAWL_MIN_INTERVAL)
+    if CRAWL_MIN_INTERVAL < 1:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse minimal crawl interval: {CRAWL_MIN_INTERVAL}, default value 60 seconds is used."
+    )
+    CRAWL_MIN_INTERVAL = 60
+
+CRAWL_MAX_INTERVAL = os.getenv("CRAWL_MAX_INTERVAL", "3600")
+try:
+    CRAWL_MAX_INTERVAL = int(CRAWL_MAX_INTERVAL)
+    if CRAWL_MAX_INTERVAL < CRAWL_MIN_INTERVAL:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse maximal crawl interval: {CRAWL_MAX_INTERVAL}, "
+        f"default value max(3600, CRAWL_MIN_INTERVAL) seconds is used."
+    )
+    CRAWL_MAX_INTERVAL = max(3600, CRAWL_MIN_INTERVAL)
+
 # what oldest messages to get (in days)
 MESSAGE_DELTA_DAYS = os.getenv("MESSAGE_DELTA_DAYS", "1")
 try:
@@ -41,3 +66,78 @@ except ValueError:
 
 # Database service URL
 DB_URL = os.getenv("DB_URL", "dbservice:80")
+
+# How many channels to crawl concurrently
+CRAWL_WORKERS = os.getenv("CRAWL_WORKERS", "4")
+try:
+    CRAWL_WORKERS = int(CRAWL_WORKERS)
+    if CRAWL_WORKERS < 1:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse crawl workers amount: {CRAWL_WORKERS}, default value 4 is used."
+    )
+    CRAWL_WORKERS = 4
+
+# How many threads of one channel to request from Slack concurrently
+THREAD_CONCURRENCY = os.getenv("THREAD_CONCURRENCY", "10")
+try:
+    THREAD_CONCURRENCY = int(THREAD_CONCURRENCY)
+    if THREAD_CONCURRENCY < 1:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse thread concurrency: {THREAD_CONCURRENCY}, default value 10 is used."
+    )
+    THREAD_CONCURRENCY = 10
+
+# How often to crawl all messages of a channel's window regardless of the crawl state (reactions of old messages, etc)
+FULL_CRAWL_INTERVAL = os.getenv("FULL_CRAWL_INTERVAL", "3600")
+try:
+    FULL_CRAWL_INTERVAL = int(FULL_CRAWL_INTERVAL)
+except ValueError:
+    _logger.warning(
+        f"Could not parse full crawl interval: {FULL_CRAWL_INTERVAL}, default value 3600 seconds is used."
+    )
+    FULL_CRAWL_INTERVAL = 3600
+
+# How many thread lengths to cache (threads without new replies are not requested again)
+THREAD_CACHE_SIZE = os.getenv("THREAD_CACHE_SIZE", "10000")
+try:
+    THREAD_CACHE_SIZE = int(THREAD_CACHE_SIZE)
+except ValueError:
+    _logger.warning(
+        f"Could not parse thread cache size: {THREAD_CACHE_SIZE}, default value 10000 is used."
+    )
+    THREAD_CACHE_SIZE = 10000
+
+# Whether several crawler replicas share channels through leases in dbservice
+SHARDED_CRAWL = os.getenv("SHARDED_CRAWL", "False").strip().lower()
+SHARDED_CRAWL = SHARDED_CRAWL == "true"
+
+# Unique name of the replica (lease owner), hostname is unique for docker containers
+CRAWLER_ID = os.getenv("CRAWLER_ID", "") or socket.gethostname()
+
+# How long a channel stays leased by a replica without heartbeats (in seconds)
+LEASE_SECONDS = os.getenv("LEASE_SECONDS", "300")
+try:
+    LEASE_SECONDS = int(LEASE_SECONDS)
+    if LEASE_SECONDS < 3:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse lease duration: {LEASE_SECONDS}, default value 300 seconds is used."
+    )
+    LEASE_SECONDS = 300
+
+# How many messages without permalinks are requested from dbservice and updated at once
+LINKS_PAGE_SIZE = os.getenv("LINKS_PAGE_SIZE", "500")
+try:
+    LINKS_PAGE_SIZE = int(LINKS_PAGE_SIZE)
+    if not 1 <= LINKS_PAGE_SIZE <= 10000:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse links page size: {LINKS_PAGE_SIZE}, default value 500 is used."
+    )
+    LINKS_PAGE_SIZE = 500
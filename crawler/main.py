@@ -1,68 +1,298 @@
 import asyncio
-import json
-import requests as r
+import time
 from datetime import datetime, timedelta
 from logging import Logger
+from typing import List, Tuple, Optional
 
 from common.LoggerFactory import create_logger
 from common.Slacker import Slacker
-from common.extras import try_request, TimerEncoder
-from common.models import Message
+from common.ChannelDirectory import ChannelDirectory
+from common.DBClient import DBClient
+from common.resilence_library.ratelimiter import SlackRateLimiter
+from common.models import CrawlState
 import crawler.config as config
+from crawler.scheduler import CrawlScheduler
 from influxdb_client import Point
 
 from config import INFLUX_API_WRITE
 
 
-async def crawl_messages_once(slacker: Slacker, logger: Logger) -> None:
-    base_url = f"http://{config.DB_URL}/"
+async def crawl_channel(
+        slacker: Slacker, db: DBClient, logger: Logger, ch_id: str, ch_name: str, state: CrawlState, full: bool
+) -> Optional[int]:
+    """
+    Crawl messages of one channel and stream them to the database page by page, so the database writes
+    received pages while the next ones are requested from Slack.
+    Only messages posted since the previous crawl are requested and sent unless full crawl is requested.
+    High-water marks of the state are moved only if everything is stored, so nothing is skipped next time.
+    Errors of Slack requests are raised, the marks are not moved then.
 
-    # get messages and insert them into database
-    ch_info = await slacker.get_channels_list() or []
-    if ch_info:
-        for ch_id, ch_name in ch_info:
-            logger.debug(f"Channel: {ch_name}")
-
-            prev_date = datetime.now() - timedelta(days=config.MESSAGE_DELTA_DAYS)
-            messages = await slacker.get_channel_messages(ch_id, prev_date)
-            if messages:
-                try_request(logger, r.put, base_url + "message/",
-                            data=json.dumps([x.dict() for x in messages], cls=TimerEncoder))
-
-        logger.info(
-            f"Messages from {len(ch_info)} channels parsed and sent to the database."
-        )
-    channels_point = Point("workspace").field("channels", len(ch_info)).time(datetime.utcnow())
-
-    # update messages without permalinks
-    answer = try_request(logger, r.get, base_url + "message/linkless")
-    if answer.is_err():
-        return
-    answer = answer.value
+    :return: amount of crawled messages or None if messages couldn't be stored
+    """
+    logger.debug(f"Channel: {ch_name}")
+
+    crawled = 0
+    previous_marks = state.last_ts, state.last_reply
+    prev_date = datetime.now() - timedelta(days=config.MESSAGE_DELTA_DAYS)
+    pages = slacker.iter_channel_messages(ch_id, prev_date, state=state, changed_only=not full)
+
+    # do not open the stream if there is nothing to send
+    first_page = []
+    async for first_page in pages:
+        if first_page:
+            break
+
+    async def all_pages():
+        nonlocal crawled
+        crawled += len(first_page)
+        yield first_page
+        async for page in pages:
+            crawled += len(page)
+            yield page
+
+    if first_page and (await db.stream_messages(all_pages())).is_err():
+        state.last_ts, state.last_reply = previous_marks
+        return None
+
+    return crawled
+
+
+async def crawl_channels(
+        slacker: Slacker,
+        db: DBClient,
+        logger: Logger,
+        scheduler: CrawlScheduler,
+        due: List[CrawlState],
+        workers: int,
+        owner: Optional[str] = None
+) -> List[Tuple[str, float, int, int]]:
+    """
+    Crawl due channels with a fixed amount of workers sharing one FIFO queue (the most overdue channels first),
+    then reschedule every channel according to its activity and persist its state
+
+    :param owner: lease owner if channels are leased, leases are extended until channels are crawled and released,
+                  crawls of channels which leases are lost are stopped and their states are dropped
+    :return: list of tuples (channel_name, crawl duration in seconds, amount of crawled messages, new interval)
+    """
+    queue = asyncio.Queue()
+    for state in due:
+        queue.put_nowait(state)
+
+    timings = []
+    leased = {x.channel_id for x in due}
+    lost = set()
+    crawls = {}  # channel_id -> task crawling the channel
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(config.LEASE_SECONDS / 3)
+            if not leased:
+                return
+            answer = await db.heartbeat_crawl_states(owner, list(leased), config.LEASE_SECONDS)
+            expired = leased - set(answer.value) if answer.is_ok() else set()
+            if expired:
+                # another replica may crawl these channels already, pages which were sent stay stored
+                logger.warning(f"Leases of channels {expired} are lost, their crawls are stopped.")
+                lost.update(expired)
+                leased.difference_update(expired)
+                for ch_id in expired:
+                    if ch_id in crawls:
+                        crawls[ch_id].cancel()
+
+    async def worker():
+        while not queue.empty():
+            state = queue.get_nowait()
+            ch_id = state.channel_id
+            if ch_id in lost:
+                continue
+            ch_name = scheduler.names.get(ch_id, ch_id)
+            full = scheduler.is_full_crawl_due(state)
+            previous_marks = state.last_ts, state.last_reply
+
+            started = time.monotonic()
+            crawls[ch_id] = asyncio.ensure_future(crawl_channel(slacker, db, logger, ch_id, ch_name, state, full))
+            try:
+                crawled = await crawls[ch_id]
+            except asyncio.CancelledError:
+                if ch_id not in lost:
+                    raise
+                continue  # the state belongs to the new lease owner
+            except Exception as e:
+                logger.exception(e)
+                crawled = None
+            finally:
+                crawls.pop(ch_id, None)
+            elapsed = time.monotonic() - started
+
+            # channel is active if new messages or replies appeared since the previous crawl
+            active = None if crawled is None else (state.last_ts, state.last_reply) != previous_marks
+            if full and crawled is not None:
+                state.last_full_crawl = datetime.utcnow()
+            scheduler.reschedule(state, active)
+            if owner is None:
+                await db.upsert_crawl_states([state])
+            else:
+                await db.release_crawl_states(owner, [state])
+                leased.discard(ch_id)
+
+            logger.debug(
+                f"Channel {ch_name} crawled in {elapsed:.2f} seconds, messages: {crawled}, "
+                f"next crawl in {state.crawl_interval} seconds"
+            )
+            timings.append((ch_name, elapsed, crawled or 0, state.crawl_interval))
+
+    heartbeat_task = asyncio.create_task(heartbeat()) if owner is not None else None
+    try:
+        await asyncio.gather(*[worker() for _ in range(min(workers, len(due)))])
+    finally:
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+    return timings
+
+
+async def update_links_and_report(
+        slacker: Slacker, db: DBClient, logger: Logger, channels_count: int, due_count: int, timings: list
+) -> None:
+    """
+    Update messages without permalinks and write crawl statistics
+    """
+    channels_point = (
+        Point("workspace").field("channels", channels_count).field("due_channels", due_count).time(datetime.utcnow())
+    )
+
+    # update messages without permalinks page by page, the newest first
+    linkless_count = 0
+    last_message = None
+    while True:
+        answer = await db.get_linkless_messages(limit=config.LINKS_PAGE_SIZE, after=last_message)
+        if answer.is_err():
+            return
+
+        empty_links_messages = answer.value
+        if not empty_links_messages:
+            break
+        linkless_count += len(empty_links_messages)
+        # messages which still have no link after the update are left for the next crawl
+        last_message = empty_links_messages[-1]
 
-    empty_links_messages = [Message(**x) for x in answer.json()]
-    if empty_links_messages:
         messages = await slacker.update_permalinks(messages=empty_links_messages)
-        answer = try_request(logger, r.patch, base_url + "message/links",
-                             data=json.dumps([x.dict() for x in messages], cls=TimerEncoder))
+        answer = await db.update_message_links(messages)
         if answer.is_ok():
-            logger.debug(f"Updated permalinks for {len(messages)} messages.")
-    linkless_messages_point = Point("workspace").field("linkless_messages", len(empty_links_messages)).time(datetime.utcnow())
-    INFLUX_API_WRITE([linkless_messages_point, channels_point])
+            logger.debug(f"Updated permalinks for {answer.value} of {len(messages)} messages.")
+        if len(empty_links_messages) < config.LINKS_PAGE_SIZE:
+            break
+    linkless_messages_point = Point("workspace").field("linkless_messages", linkless_count).time(datetime.utcnow())
+    channel_points = [
+        Point("crawler").tag("channel", ch_name)
+        .field("crawl_seconds", elapsed).field("messages", crawled).field("crawl_interval", interval)
+        for ch_name, elapsed, crawled, interval in timings
+    ]
+    rate_limit_points = [
+        Point("slack_rate_limit").tag("method", method)
+        .field("queue_depth", stats["queue_depth"]).field("rate", float(stats["rate"]))
+        .field("requests", stats["requests"]).field("throttled", stats["throttled"])
+        for method, stats in SlackRateLimiter.metrics().items()
+    ]
+    INFLUX_API_WRITE([linkless_messages_point, channels_point, *channel_points, *rate_limit_points])
+
+
+async def crawl_messages_once(
+        slacker: Slacker, db: DBClient, logger: Logger, scheduler: CrawlScheduler, channels: ChannelDirectory
+) -> None:
+    ch_info = await channels.get_channels() or []
+
+    # continue the persisted schedule, without it every channel is due and crawled fully
+    states = {}
+    if not scheduler.states:
+        answer = await db.get_crawl_states()
+        states = {x.channel_id: x for x in answer.ok() or []}
+    scheduler.update_channels(ch_info, states)
+
+    due = scheduler.pop_due()
+    if not due:
+        return
+
+    # get messages and insert them into database
+    started = time.monotonic()
+    timings = await crawl_channels(slacker, db, logger, scheduler, due, config.CRAWL_WORKERS)
+    logger.info(
+        f"Messages from {len(due)} of {len(ch_info)} channels parsed and sent to the database "
+        f"in {time.monotonic() - started:.2f} seconds with {config.CRAWL_WORKERS} workers."
+    )
+    await update_links_and_report(slacker, db, logger, len(ch_info), len(due), timings)
+
+
+async def crawl_leased_once(
+        slacker: Slacker, db: DBClient, logger: Logger, scheduler: CrawlScheduler, channels: ChannelDirectory
+) -> int:
+    """
+    Lease due channels in dbservice and crawl them, so several replicas never crawl the same channel.
+    The schedule is kept in dbservice only, the scheduler is used for interval adaptation.
 
+    :return: amount of crawled channels
+    """
+    ch_info = await channels.get_channels() or []
+    if ch_info and dict(ch_info) != scheduler.names:
+        if (await db.register_crawl_channels([ch_id for ch_id, _ in ch_info])).is_ok():
+            scheduler.names = dict(ch_info)
 
-async def crawl_messages(slacker: Slacker, logger: Logger):
+    answer = await db.claim_crawl_states(
+        owner=config.CRAWLER_ID, limit=config.CRAWL_WORKERS * 2, lease_seconds=config.LEASE_SECONDS
+    )
+    due = answer.ok() or []
+    if not due:
+        return 0
+
+    for state in due:
+        if state.crawl_interval is None:
+            state.crawl_interval = scheduler.initial_interval
+
+    started = time.monotonic()
+    timings = await crawl_channels(slacker, db, logger, scheduler, due, config.CRAWL_WORKERS, owner=config.CRAWLER_ID)
+    logger.info(
+        f"Messages from {len(due)} leased channels parsed and sent to the database "
+        f"in {time.monotonic() - started:.2f} seconds with {config.CRAWL_WORKERS} workers."
+    )
+    await update_links_and_report(slacker, db, logger, len(ch_info), len(due), timings)
+    return len(due)
+
+
+async def crawl_messages(slacker: Slacker, db: DBClient, logger: Logger):
     logger.info("Wait for 15 seconds to allow DB services to start...")
     await asyncio.sleep(15)
     logger.info("Starting crawling...")
+
+    scheduler = CrawlScheduler(
+        min_interval=config.CRAWL_MIN_INTERVAL,
+        max_interval=config.CRAWL_MAX_INTERVAL,
+        initial_interval=config.CRAWL_INTERVAL,
+        full_crawl_interval=config.FULL_CRAWL_INTERVAL
+    )
+    channels = ChannelDirectory(slacker=slacker, logger=logger, ttl=config.CRAWL_INTERVAL)
+    if config.SHARDED_CRAWL:
+        logger.info(f"Sharded crawl, replica: {config.CRAWLER_ID}")
+        while True:
+            crawled = 0
+            try:
+                crawled = await crawl_leased_once(
+                    slacker=slacker, db=db, logger=logger, scheduler=scheduler, channels=channels
+                )
+            except Exception as e:
+                logger.exception(e)
+
+            # claim the next batch right away while there is a backlog
+            await asyncio.sleep(1 if crawled else config.CRAWL_MIN_INTERVAL)
+
     while True:
         try:
-            await crawl_messages_once(slacker=slacker, logger=logger)
+            await crawl_messages_once(slacker=slacker, db=db, logger=logger, scheduler=scheduler, channels=channels)
         except Exception as e:
             logger.exception(e)
 
-        # wait for next time
-        await asyncio.sleep(config.CRAWL_INTERVAL)
+        # wait for the nearest due channel, but check for new channels at least every CRAWL_INTERVAL
+        next_due = scheduler.next_due()
+        delay = config.CRAWL_MIN_INTERVAL if next_due is None else (next_due - datetime.utcnow()).total_seconds()
+        await asyncio.sleep(min(max(delay, 1), config.CRAWL_INTERVAL))
 
 
 if __name__ == '__main__':
@@ -73,12 +303,17 @@ if __name__ == '__main__':
     slacker = Slacker(
         user_token=config.SLACK_USER_TOKEN,
         bot_token=config.SLACK_BOT_TOKEN,
-        logger=logger
+        logger=logger,
+        thread_concurrency=config.THREAD_CONCURRENCY,
+        thread_cache_size=config.THREAD_CACHE_SIZE,
+        base_url=config.SLACK_API_URL
     )
 
+    db = DBClient(db_url=config.DB_URL, logger=logger)
+
     # Instantiate crawler with corresponding function
     crawler_task = loop.create_task(
-        crawl_messages(slacker=slacker, logger=logger)
+        crawl_messages(slacker=slacker, db=db, logger=logger)
     )
 
     loop.run_until_complete(crawler_task)
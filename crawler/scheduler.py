@@ -0,0 +1,113 @@
+import heapq
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from common.models import CrawlState
+
+
+class CrawlScheduler:
+    """
+    Priority queue of channels ordered by their next crawl time.
+    Crawl interval of a channel is halved after every crawl with new activity
+    and doubled after every crawl without it, within [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval: int, max_interval: int, initial_interval: int, full_crawl_interval: int):
+        """
+        :param min_interval: the shortest crawl interval of an active channel in seconds
+        :param max_interval: the longest crawl interval of a dormant channel in seconds
+        :param initial_interval: crawl interval of a channel without history in seconds
+        :param full_crawl_interval: how often to crawl all messages of a channel regardless of activity in seconds
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = min(max(initial_interval, min_interval), max_interval)
+        self.full_crawl_interval = full_crawl_interval
+
+        self.states: Dict[str, CrawlState] = {}
+        self.names: Dict[str, str] = {}
+        # (next crawl time, channel id), entries are removed lazily when their channel is rescheduled or removed
+        self._heap: List[Tuple[datetime, str]] = []
+
+    def __push(self, state: CrawlState) -> None:
+        heapq.heappush(self._heap, (state.next_crawl, state.channel_id))
+
+    def update_channels(self, ch_info: List[Tuple[str, str]], states: Optional[Dict[str, CrawlState]] = None) -> None:
+        """
+        Synchronize scheduled channels with the workspace: new channels are due immediately, removed ones are dropped
+
+        :param ch_info: list of tuples (channel_id, channel_name)
+        :param states: persisted states of channels (used for channels that are not scheduled yet)
+        """
+        states = states or {}
+        now = datetime.utcnow()
+
+        self.names = dict(ch_info)
+        for ch_id in list(self.states):
+            if ch_id not in self.names:
+                del self.states[ch_id]
+
+        for ch_id in self.names:
+            if ch_id in self.states:
+                continue
+            state = states.get(ch_id, None) or CrawlState(channel_id=ch_id)
+            if state.next_crawl is None:
+                state.next_crawl = now
+            if state.crawl_interval is None:
+                state.crawl_interval = self.initial_interval
+            self.states[ch_id] = state
+            self.__push(state)
+
+    def pop_due(self, now: Optional[datetime] = None) -> List[CrawlState]:
+        """
+        Remove channels which time has come from the queue, they should be rescheduled after crawling
+
+        :return: states of due channels, the most overdue first
+        """
+        now = now or datetime.utcnow()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            next_crawl, ch_id = heapq.heappop(self._heap)
+            state = self.states.get(ch_id, None)
+            if state is not None and state.next_crawl == next_crawl:
+                due.append(state)
+        return due
+
+    def next_due(self) -> Optional[datetime]:
+        """
+        :return: the nearest crawl time or None if nothing is scheduled
+        """
+        while self._heap:
+            next_crawl, ch_id = self._heap[0]
+            state = self.states.get(ch_id, None)
+            if state is not None and state.next_crawl == next_crawl:
+                return next_crawl
+            heapq.heappop(self._heap)
+        return None
+
+    def is_full_crawl_due(self, state: CrawlState, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.utcnow()
+        return (
+            state.last_full_crawl is None or
+            now - state.last_full_crawl >= timedelta(seconds=self.full_crawl_interval)
+        )
+
+    def reschedule(self, state: CrawlState, active: Optional[bool], now: Optional[datetime] = None) -> None:
+        """
+        Adapt crawl interval of the channel and put it back into the queue
+
+        :param state: state of the crawled channel
+        :param active: whether new messages or replies were found, None if the crawl failed (interval is kept)
+        :param now: time of the crawl end
+        """
+        now = now or datetime.utcnow()
+        interval = state.crawl_interval or self.initial_interval
+        if active is True:
+            interval = max(self.min_interval, interval // 2)
+        elif active is False:
+            interval = min(self.max_interval, interval * 2)
+
+        state.crawl_interval = interval
+        state.next_crawl = now + timedelta(seconds=interval)
+        if state.channel_id in self.states:
+            self.__push(state)
@@ -0,0 +1,106 @@
+import unittest
+from datetime import datetime, timedelta
+
+from common.models import CrawlState
+from crawler.scheduler import CrawlScheduler
+
+NOW = datetime(2021, 2, 3, 12, 0, 0)
+
+
+class CrawlSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.scheduler = CrawlScheduler(
+            min_interval=60, max_interval=3600, initial_interval=600, full_crawl_interval=7200
+        )
+
+    def schedule(self, *channels: str) -> None:
+        self.scheduler.update_channels([(ch_id, f"name-{ch_id}") for ch_id in channels])
+
+    def test_initial_interval_within_bounds(self):
+        self.assertEqual(CrawlScheduler(60, 3600, 10, 7200).initial_interval, 60)
+        self.assertEqual(CrawlScheduler(60, 3600, 10000, 7200).initial_interval, 3600)
+
+    def test_interval_adapts_to_activity(self):
+        state = CrawlState(channel_id="C1", crawl_interval=600)
+
+        self.scheduler.reschedule(state, active=True, now=NOW)
+        self.assertEqual(state.crawl_interval, 300)
+        self.assertEqual(state.next_crawl, NOW + timedelta(seconds=300))
+
+        self.scheduler.reschedule(state, active=False, now=NOW)
+        self.scheduler.reschedule(state, active=False, now=NOW)
+        self.assertEqual(state.crawl_interval, 1200)
+
+        # failed crawls keep the interval
+        self.scheduler.reschedule(state, active=None, now=NOW)
+        self.assertEqual(state.crawl_interval, 1200)
+        self.assertEqual(state.next_crawl, NOW + timedelta(seconds=1200))
+
+    def test_interval_bounds(self):
+        state = CrawlState(channel_id="C1", crawl_interval=100)
+        for _ in range(3):
+            self.scheduler.reschedule(state, active=True, now=NOW)
+        self.assertEqual(state.crawl_interval, 60)
+
+        for _ in range(10):
+            self.scheduler.reschedule(state, active=False, now=NOW)
+        self.assertEqual(state.crawl_interval, 3600)
+
+    def test_new_channels_due_immediately(self):
+        self.schedule("C1", "C2")
+        due = self.scheduler.pop_due(now=datetime.utcnow() + timedelta(seconds=1))
+        self.assertEqual(sorted(x.channel_id for x in due), ["C1", "C2"])
+        self.assertEqual([], self.scheduler.pop_due(now=datetime.utcnow() + timedelta(seconds=1)))
+        self.assertIsNone(self.scheduler.next_due())
+
+    def test_persisted_schedule_continued(self):
+        state = CrawlState(channel_id="C1", next_crawl=NOW + timedelta(seconds=500), crawl_interval=1000)
+        self.scheduler.update_channels([("C1", "general")], {"C1": state})
+        self.assertEqual(self.scheduler.next_due(), NOW + timedelta(seconds=500))
+        self.assertEqual(self.scheduler.pop_due(now=NOW), [])
+        self.assertEqual(self.scheduler.pop_due(now=NOW + timedelta(seconds=500)), [state])
+
+    def test_rescheduled_channel_popped_once(self):
+        self.schedule("C1", "C2")
+        c1, c2 = self.scheduler.states["C1"], self.scheduler.states["C2"]
+        self.scheduler.reschedule(c1, active=None, now=NOW)  # due in 600 seconds
+        self.scheduler.reschedule(c2, active=None, now=NOW + timedelta(seconds=100))  # due in 700 seconds
+
+        # the channel is queued again while its previous entries are still in the heap
+        self.scheduler.reschedule(c1, active=False, now=NOW)  # due in 1200 seconds
+        self.assertEqual(self.scheduler.next_due(), NOW + timedelta(seconds=700))
+
+        due = self.scheduler.pop_due(now=NOW + timedelta(seconds=1000))
+        self.assertEqual(due, [c2])
+        due = self.scheduler.pop_due(now=NOW + timedelta(seconds=1200))
+        self.assertEqual(due, [c1])
+        self.assertIsNone(self.scheduler.next_due())
+
+    def test_removed_channel_dropped(self):
+        self.schedule("C1", "C2")
+        self.schedule("C2")
+        due = self.scheduler.pop_due(now=datetime.utcnow() + timedelta(seconds=1))
+        self.assertEqual([x.channel_id for x in due], ["C2"])
+
+        # the state of a removed channel is not queued again after its crawl
+        state = CrawlState(channel_id="C1", crawl_interval=600)
+        self.scheduler.reschedule(state, active=True, now=NOW)
+        self.assertEqual(self.scheduler.pop_due(now=NOW + timedelta(days=1)), [])
+
+    def test_most_overdue_first(self):
+        states = {
+            ch_id: CrawlState(channel_id=ch_id, next_crawl=NOW - timedelta(seconds=delay), crawl_interval=600)
+            for ch_id, delay in (("C1", 10), ("C2", 300), ("C3", 60))
+        }
+        self.scheduler.update_channels([(x, x) for x in states], states)
+        self.assertEqual([x.channel_id for x in self.scheduler.pop_due(now=NOW)], ["C2", "C3", "C1"])
+
+    def test_full_crawl_trigger(self):
+        state = CrawlState(channel_id="C1")
+        self.assertTrue(self.scheduler.is_full_crawl_due(state, now=NOW))
+
+        state.last_full_crawl = NOW - timedelta(seconds=7199)
+        self.assertFalse(self.scheduler.is_full_crawl_due(state, now=NOW))
+
+        state.last_full_crawl = NOW - timedelta(seconds=7200)
+        self.assertTrue(self.scheduler.is_full_crawl_due(state, now=NOW))
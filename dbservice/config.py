@@ -50,3 +50,103 @@ except ValueError:
         f"Could not parse ignore limit value: {IGNORE_LIMIT}, default value 100 is used."
     )
     IGNORE_LIMIT = 100
+
+# how many authors' ignore lists each worker keeps in memory (0 turns the cache off) and for how long (in seconds),
+# the cache is invalidated on ignore list changes in any worker, TTL only limits staleness if a notification is lost
+IGNORE_CACHE_SIZE = os.getenv("IGNORE_CACHE_SIZE", "1000")
+try:
+    IGNORE_CACHE_SIZE = int(IGNORE_CACHE_SIZE)
+except ValueError:
+    _logger.warning(
+        f"Could not parse ignore cache size value: {IGNORE_CACHE_SIZE}, default value 1000 is used."
+    )
+    IGNORE_CACHE_SIZE = 1000
+
+IGNORE_CACHE_TTL = os.getenv("IGNORE_CACHE_TTL", "300")
+try:
+    IGNORE_CACHE_TTL = int(IGNORE_CACHE_TTL)
+except ValueError:
+    _logger.warning(
+        f"Could not parse ignore cache TTL value: {IGNORE_CACHE_TTL}, default value 300 is used."
+    )
+    IGNORE_CACHE_TTL = 300
+
+# how many best messages of each sorting type are kept for every channel and hour (0 turns rollups off),
+# top requests over windows of at least ROLLUP_MIN_WINDOW hours are answered from these rollups;
+# off by default: top indexes answer such requests faster (see benchmarks/top_query_benchmark.py --rollup-size)
+ROLLUP_SIZE = os.getenv("ROLLUP_SIZE", "0")
+try:
+    ROLLUP_SIZE = int(ROLLUP_SIZE)
+except ValueError:
+    _logger.warning(
+        f"Could not parse rollup size value: {ROLLUP_SIZE}, default value 0 is used."
+    )
+    ROLLUP_SIZE = 0
+
+ROLLUP_MIN_WINDOW = os.getenv("ROLLUP_MIN_WINDOW", "24")
+try:
+    ROLLUP_MIN_WINDOW = int(ROLLUP_MIN_WINDOW)
+except ValueError:
+    _logger.warning(
+        f"Could not parse rollup minimal window value: {ROLLUP_MIN_WINDOW}, default value 24 is used."
+    )
+    ROLLUP_MIN_WINDOW = 24
+
+# how often (in seconds) rollups of changed hours are recomputed, changed hours are read from messages until then
+ROLLUP_REFRESH_INTERVAL = os.getenv("ROLLUP_REFRESH_INTERVAL", "60")
+try:
+    ROLLUP_REFRESH_INTERVAL = int(ROLLUP_REFRESH_INTERVAL)
+except ValueError:
+    _logger.warning(
+        f"Could not parse rollup refresh interval value: {ROLLUP_REFRESH_INTERVAL}, default value 60 is used."
+    )
+    ROLLUP_REFRESH_INTERVAL = 60
+
+# how many results of top requests each worker keeps in memory (0 turns the cache off), results are dropped
+# once per write request of messages and on preset changes; request windows are shortened by up to
+# TOP_CACHE_ROUNDING seconds to share entries
+TOP_CACHE_SIZE = os.getenv("TOP_CACHE_SIZE", "1000")
+try:
+    TOP_CACHE_SIZE = int(TOP_CACHE_SIZE)
+except ValueError:
+    _logger.warning(
+        f"Could not parse top cache size value: {TOP_CACHE_SIZE}, default value 1000 is used."
+    )
+    TOP_CACHE_SIZE = 1000
+
+TOP_CACHE_ROUNDING = os.getenv("TOP_CACHE_ROUNDING", "60")
+try:
+    TOP_CACHE_ROUNDING = int(TOP_CACHE_ROUNDING)
+except ValueError:
+    _logger.warning(
+        f"Could not parse top cache rounding value: {TOP_CACHE_ROUNDING}, default value 60 is used."
+    )
+    TOP_CACHE_ROUNDING = 60
+
+# how many streamed messages are validated and written to the database at once
+INGEST_CHUNK_SIZE = os.getenv("INGEST_CHUNK_SIZE", "500")
+try:
+    INGEST_CHUNK_SIZE = int(INGEST_CHUNK_SIZE)
+    if INGEST_CHUNK_SIZE < 1:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse ingest chunk size value: {INGEST_CHUNK_SIZE}, default value 500 is used."
+    )
+    INGEST_CHUNK_SIZE = 500
+
+# upserts of at least this amount of messages are copied into a temporary table and merged by one statement;
+# row by row upserts are as fast at about 100 messages (benchmarks/upsert_benchmark.py), full chunks of streamed
+# upserts (INGEST_CHUNK_SIZE) are always copied
+UPSERT_COPY_THRESHOLD = os.getenv("UPSERT_COPY_THRESHOLD", "150")
+try:
+    UPSERT_COPY_THRESHOLD = int(UPSERT_COPY_THRESHOLD)
+except ValueError:
+    _logger.warning(
+        f"Could not parse upsert copy threshold value: {UPSERT_COPY_THRESHOLD}, default value 150 is used."
+    )
+    UPSERT_COPY_THRESHOLD = 150
+
+# whether list responses are encoded to JSON straight from database rows (with orjson) instead of pydantic models
+FAST_JSON = os.getenv("FAST_JSON", "True").strip().lower()
+FAST_JSON = FAST_JSON == "true"
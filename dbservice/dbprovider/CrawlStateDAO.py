@@ -0,0 +1,112 @@
+from decimal import Decimal
+from typing import List, Optional
+
+from models import CrawlState
+from .engine import db_engine, DBEngine
+
+
+class CrawlStateDAO:
+    def __init__(self, engine: DBEngine):
+        self.engine = engine
+
+    async def get_crawl_states(self, channel_id: Optional[str] = None) -> List[CrawlState]:
+        request = "SELECT * FROM CrawlState"
+        if channel_id is None:
+            states = await self.engine.make_fetch_rows(request)
+        else:
+            states = await self.engine.make_fetch_rows(request + " WHERE channel_id = $1", channel_id)
+        return [CrawlState(**x) for x in states]
+
+    async def upsert_crawl_states(self, states: List[CrawlState]) -> None:
+        request = """
+            INSERT INTO CrawlState (channel_id, last_ts, last_reply, next_crawl, crawl_interval, last_full_crawl)
+            VALUES ($1, $2, $3, $4, $5, $6)
+            ON CONFLICT (channel_id)
+            DO UPDATE SET
+                last_ts = GREATEST(CrawlState.last_ts, EXCLUDED.last_ts),
+                last_reply = GREATEST(CrawlState.last_reply, EXCLUDED.last_reply),
+                next_crawl = COALESCE(EXCLUDED.next_crawl, CrawlState.next_crawl),
+                crawl_interval = COALESCE(EXCLUDED.crawl_interval, CrawlState.crawl_interval),
+                last_full_crawl = COALESCE(EXCLUDED.last_full_crawl, CrawlState.last_full_crawl);
+        """
+        sequence = [
+            (
+                x.channel_id, Decimal(x.last_ts), Decimal(x.last_reply),
+                x.next_crawl, x.crawl_interval, x.last_full_crawl
+            )
+            for x in states
+        ]
+        await self.engine.make_execute_many(request, sequence)
+
+    async def register_channels(self, channel_ids: List[str]) -> None:
+        """
+        Add states of new channels (they are due immediately) and remove states of channels that don't exist anymore
+        """
+        await self.engine.make_execute(
+            "INSERT INTO CrawlState (channel_id) SELECT unnest($1::TEXT[]) ON CONFLICT (channel_id) DO NOTHING;",
+            channel_ids
+        )
+        await self.engine.make_execute("DELETE FROM CrawlState WHERE channel_id <> ALL($1::TEXT[]);", channel_ids)
+
+    async def claim_crawl_states(self, owner: str, limit: int, lease_seconds: float) -> List[CrawlState]:
+        """
+        Lease due channels which are not leased by anyone else (or which leases expired), the most overdue first.
+        Rows locked by concurrent claims are skipped, so replicas never receive the same channel.
+        """
+        request = """
+            WITH due AS (
+                SELECT channel_id FROM CrawlState
+                WHERE (next_crawl IS NULL OR next_crawl <= (now() AT TIME ZONE 'utc'))
+                  AND (lease_owner IS NULL OR lease_expires < (now() AT TIME ZONE 'utc'))
+                ORDER BY next_crawl NULLS FIRST
+                LIMIT $2
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE CrawlState
+            SET lease_owner = $1, lease_expires = (now() AT TIME ZONE 'utc') + make_interval(secs => $3)
+            FROM due
+            WHERE CrawlState.channel_id = due.channel_id
+            RETURNING CrawlState.*;
+        """
+        states = await self.engine.make_fetch_rows(request, owner, limit, lease_seconds)
+        return [CrawlState(**x) for x in states]
+
+    async def heartbeat_crawl_states(self, owner: str, channel_ids: List[str], lease_seconds: float) -> List[str]:
+        """
+        Extend leases of the owner
+
+        :return: IDs of channels which are still leased by the owner
+        """
+        request = """
+            UPDATE CrawlState
+            SET lease_expires = (now() AT TIME ZONE 'utc') + make_interval(secs => $3)
+            WHERE lease_owner = $1 AND channel_id = ANY($2::TEXT[])
+            RETURNING channel_id;
+        """
+        rows = await self.engine.make_fetch_rows(request, owner, channel_ids, lease_seconds)
+        return [x["channel_id"] for x in rows]
+
+    async def release_crawl_states(self, owner: str, states: List[CrawlState]) -> None:
+        """
+        Store crawl results and release leases, states leased by another replica meanwhile are not touched
+        """
+        request = """
+            UPDATE CrawlState SET
+                last_ts = GREATEST(last_ts, $3),
+                last_reply = GREATEST(last_reply, $4),
+                next_crawl = COALESCE($5, next_crawl),
+                crawl_interval = COALESCE($6, crawl_interval),
+                last_full_crawl = COALESCE($7, last_full_crawl),
+                lease_owner = NULL,
+                lease_expires = NULL
+            WHERE channel_id = $2 AND lease_owner = $1;
+        """
+        sequence = [
+            (owner, x.channel_id, Decimal(x.last_ts), Decimal(x.last_reply),
+             x.next_crawl, x.crawl_interval, x.last_full_crawl)
+            for x in states
+        ]
+        await self.engine.make_execute_many(request, sequence)
+
+
+crawl_state_dao = CrawlStateDAO(db_engine)
@@ -1,16 +1,48 @@
 from typing import List
 
+from common.utils.cache import TTLCache
+from config import IGNORE_CACHE_SIZE, IGNORE_CACHE_TTL
 from .engine import db_engine, DBEngine
 
+# ignore list changes are broadcast to all dbservice workers through this notification channel
+IGNORE_CHANNEL = "ignore_list_changed"
+
 
 class IgnoreDAO:
-    def __init__(self, engine: DBEngine):
+    def __init__(self, engine: DBEngine, cache_size: int = 0, cache_ttl: float = 300):
         self.engine = engine
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)  # author_id -> list of ignored usernames
+
+    @property
+    def cache_enabled(self) -> bool:
+        return self.cache.maxsize > 0
+
+    async def listen_for_changes(self) -> None:
+        """
+        Invalidate cached ignore lists changed by other workers
+        """
+        if self.cache_enabled:
+            await self.engine.listen(IGNORE_CHANNEL, self.cache.pop)
+
+    async def __notify_change(self, author_id: str) -> None:
+        self.cache.pop(author_id)
+        if self.cache_enabled:
+            await self.engine.make_execute("SELECT pg_notify($1, $2)", IGNORE_CHANNEL, author_id)
 
     async def get_ignore_list(self, author_id: str) -> List[str]:
         request = "SELECT ignore_username FROM IgnoreList WHERE author_username = $1"
         return await self.engine.make_fetch_rows(request, author_id)
 
+    async def get_ignored_usernames(self, author_id: str) -> List[str]:
+        """
+        Cached list of usernames ignored by the author
+        """
+        ignored = self.cache.get(author_id)
+        if ignored is None:
+            ignored = [x['ignore_username'] for x in await self.get_ignore_list(author_id)]
+            self.cache.put(author_id, ignored)
+        return ignored
+
     async def get_ignore_list_length(self, author_id: str) -> int:
         request = "SELECT COUNT(*) FROM IgnoreList WHERE author_username = $1"
         return await self.engine.make_fetchval(request, author_id)
@@ -22,12 +54,14 @@ class IgnoreDAO:
     async def insert_into_ignore_list(self, author_id: str, ignore_id: str) -> bool:
         request = "INSERT INTO IgnoreList (author_username, ignore_username) VALUES ($1, $2) ON CONFLICT DO NOTHING"
         result = await self.engine.make_execute(request, author_id, ignore_id)
+        await self.__notify_change(author_id)
         return bool(result)  # 0 (false) if conflict occurred and name is already presented, 1 (true) otherwise
 
     async def delete_from_ignore_list(self, author_id, ignore_id) -> bool:
         request = "DELETE FROM IgnoreList WHERE author_username = $1 AND ignore_username = $2"
         result = await self.engine.make_execute(request, author_id, ignore_id)
+        await self.__notify_change(author_id)
         return bool(result)  # 0 (false) if nothing deleted, 1 (true) otherwise
 
 
-ignore_dao = IgnoreDAO(db_engine)
+ignore_dao = IgnoreDAO(db_engine, cache_size=IGNORE_CACHE_SIZE, cache_ttl=IGNORE_CACHE_TTL)
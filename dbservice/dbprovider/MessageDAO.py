@@ -1,14 +1,162 @@
+from datetime import datetime, timezone
 from decimal import Decimal
-from typing import List, Any
+from typing import List, Any, Tuple, Optional, Union
+
+from asyncpg import Record
 
 from common.Enums import SortingType
-from models import Message
+from config import ROLLUP_SIZE, ROLLUP_MIN_WINDOW, UPSERT_COPY_THRESHOLD
+from models import Message, MessageDelta
+from .IgnoreDAO import ignore_dao, IgnoreDAO
 from .engine import db_engine, DBEngine
+from .rollups import BUCKET_SECONDS, REFRESH_BATCH, rollup_refresh_statement
+from .topcache import top_cache, TopCache
 
 
 class MessageDAO:
-    def __init__(self, engine: DBEngine):
+    def __init__(
+            self,
+            engine: DBEngine,
+            ignore: IgnoreDAO,
+            top: TopCache,
+            rollup_size: int = 0,
+            rollup_min_window: int = 24,
+            copy_threshold: int = 150
+    ):
         self.engine = engine
+        self.ignore = ignore
+        self.top = top
+        self.copy_threshold = copy_threshold
+        self.rollup_size = rollup_size
+        self.rollup_min_window = rollup_min_window
+
+    async def __make_ignore_filter(self, user_id: str, arg_number: int, table: str = "message") -> Tuple[str, Any]:
+        """
+        Condition excluding messages of users ignored by the user and its argument
+
+        :param user_id: author of the ignore list
+        :param arg_number: number of the query argument used by the condition
+        :param table: name or alias of the filtered table (with username column)
+        :return: SQL condition on the table and the value of its argument
+        """
+        if self.ignore.cache_enabled:
+            # cached ignore set is passed as an array, no IgnoreList lookups at all
+            ignored = await self.ignore.get_ignored_usernames(user_id)
+            return f"{table}.username <> ALL(${arg_number}::TEXT[])", ignored
+
+        # anti-join uses the (author_username, ignore_username) unique index for every candidate row
+        return f"""NOT EXISTS (
+                SELECT 1 FROM IgnoreList
+                WHERE author_username = ${arg_number} AND ignore_username = {table}.username
+            )""", user_id
+
+    def __rollups_applicable(self, after: datetime, top_count: int) -> bool:
+        window = (datetime.now(timezone.utc) - after).total_seconds()
+        return 0 < top_count <= self.rollup_size and window >= self.rollup_min_window * BUCKET_SECONDS
+
+    async def __get_top_messages_from_rollups(
+            self,
+            after: datetime,
+            user_id: str,
+            sorting_type: SortingType,
+            top_count: int,
+            channel_ids: Optional[List[str]] = None,
+    ) -> Optional[List[Record]]:
+        """
+        Top messages merged from rollups of hours fully inside the window, changed (not refreshed yet) hours
+        and the partial first hour are read from messages.
+        A message outside of rollups can't be better than the worst rollup entry of its hour, so the answer is exact
+        if the worst entries of all full rollups are not better than the last returned message.
+
+        :param channel_ids: channels to take messages from, all channels if None
+        :return: rows of top messages or None if rollups can't answer the request (it should be made on messages then)
+        """
+        first_hour = int(after.timestamp() // BUCKET_SECONDS) + 1  # the first hour which is fully inside the window
+        sorting = sorting_type.value
+
+        def channels(table: str, arg_number: int) -> str:
+            return "TRUE" if channel_ids is None else f"{table}.channel_id = ANY(${arg_number}::TEXT[])"
+        channel_args = [] if channel_ids is None else [channel_ids]
+
+        request = f"""
+            SELECT
+                (SELECT count(*) FROM RollupDirty d WHERE d.hour >= $1 AND {channels("d", 4)}) AS dirty,
+                (
+                    SELECT max(r.value) FROM MessageRollup r
+                    WHERE r.sorting = $2 AND r.hour >= $1 AND r.position = $3 AND {channels("r", 4)}
+                    AND NOT EXISTS (SELECT 1 FROM RollupDirty d WHERE d.channel_id = r.channel_id AND d.hour = r.hour)
+                ) AS threshold;
+        """
+        stats = (await self.engine.make_fetch_rows(request, first_hour, sorting, self.rollup_size, *channel_args))[0]
+        if stats['dirty'] >= REFRESH_BATCH:
+            # rollups are being filled or lag behind, reading changed hours from messages isn't cheaper
+            return None
+
+        rollup_filter, ignore_arg = await self.__make_ignore_filter(user_id, 5, "r")
+        ignore_filter, _ = await self.__make_ignore_filter(user_id, 5)
+        request = f"""
+            WITH candidates AS (
+                (
+                    SELECT r.channel_id, r.timestamp FROM MessageRollup r
+                    WHERE r.sorting = $3 AND r.hour >= $2 AND {channels("r", 6)} AND {rollup_filter}
+                    AND NOT EXISTS (SELECT 1 FROM RollupDirty d WHERE d.channel_id = r.channel_id AND d.hour = r.hour)
+                    ORDER BY r.value DESC
+                    LIMIT $4
+                )
+                UNION ALL
+                (
+                    SELECT message.channel_id, message.timestamp FROM RollupDirty d
+                    JOIN message
+                        ON message.channel_id = d.channel_id
+                        AND message.timestamp >= d.hour * {BUCKET_SECONDS}
+                        AND message.timestamp < (d.hour + 1) * {BUCKET_SECONDS}
+                    WHERE d.hour >= $2 AND {channels("d", 6)} AND {ignore_filter}
+                    ORDER BY message.{sorting} DESC
+                    LIMIT $4
+                )
+                UNION ALL
+                (
+                    SELECT message.channel_id, message.timestamp FROM message
+                    WHERE message.posted_at >= $1 AND message.timestamp < $2 * {BUCKET_SECONDS}
+                    AND {channels("message", 6)} AND {ignore_filter}
+                    ORDER BY message.{sorting} DESC
+                    LIMIT $4
+                )
+            )
+            SELECT message.* FROM candidates JOIN message USING (channel_id, timestamp)
+            ORDER BY {sorting} DESC
+            LIMIT $4;
+        """
+        messages = await self.engine.make_fetch_rows(
+            request, after, first_hour, sorting, top_count, ignore_arg, *channel_args
+        )
+
+        threshold = stats['threshold']
+        if threshold is not None and (
+                len(messages) < top_count or messages[-1][sorting] is None or messages[-1][sorting] < threshold
+        ):
+            return None
+        return messages
+
+    async def __get_preset_channel_ids(self, preset_name: str, user_id: str) -> Optional[List[str]]:
+        request = """
+            SELECT channel_ids FROM preset
+            WHERE name = $1 AND (username = $2 OR username IS NULL)
+            ORDER BY username NULLS LAST
+            LIMIT 1;
+        """
+        return await self.engine.make_fetchval(request, preset_name, user_id)
+
+    async def refresh_rollups(self) -> int:
+        """
+        Recompute rollups of a batch of changed hours
+
+        :return: number of refreshed (channel, hour) buckets
+        """
+        if self.rollup_size <= 0:
+            return 0
+        status = await self.engine.make_execute(rollup_refresh_statement(self.rollup_size))
+        return int(status.split()[-1])  # "DELETE <count>"
 
     @staticmethod
     def __make_insert_values_from_messages_array(messages: List[Message]) -> List[tuple]:
@@ -21,6 +169,7 @@ class MessageDAO:
                 message.reactions_rate,
                 message.thread_length,
                 message.channel_id,
+                message.thread_ts,
             )
             for message in messages
         ]
@@ -29,98 +178,260 @@ class MessageDAO:
     def __request_messages_to_message_class(request_messages: List[Any]) -> List[Message]:
         return [Message(**message) for message in request_messages]
 
-    @staticmethod
-    def __make_link_update_values_from_messages_array(messages: List[Message]) -> List[tuple]:
-        return [(x.link, Decimal(x.timestamp), x.channel_id) for x in messages]
-
     async def create_messages(self, messages: List[Message]) -> None:
-        request = f"""
+        request = """
         INSERT INTO message (username, timestamp, reply_count, reply_users_count,
-                            reactions_rate, thread_length, channel_id)
-        VALUES ($1, $2, $3, $4, $5, $6, $7);
+                            reactions_rate, thread_length, channel_id, thread_ts)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8);
         """
 
         sequence = self.__make_insert_values_from_messages_array(messages)
         await self.engine.make_execute_many(request, sequence)
+        await self.top.notify_change()
 
-    async def upsert_messages(self, messages: List[Message]) -> None:
-        request = f"""
+    async def upsert_messages(self, messages: List[Message], notify: bool = True) -> None:
+        """
+        :param notify: invalidate cached top results, streamed upserts do it once after all their chunks
+        """
+        if len(messages) >= self.copy_threshold:
+            await self.__copy_upsert_messages(messages)
+        else:
+            await self.__upsert_messages_by_row(messages)
+        if notify:
+            await self.top.notify_change()
+
+    async def __upsert_messages_by_row(self, messages: List[Message]) -> None:
+        request = """
         INSERT INTO message (username, timestamp, reply_count, reply_users_count,
-                            reactions_rate, thread_length, channel_id)
-        VALUES ($1, $2, $3, $4, $5, $6, $7)
+                            reactions_rate, thread_length, channel_id, thread_ts)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
         ON CONFLICT (timestamp, channel_id)
         DO UPDATE SET
             reply_count = EXCLUDED.reply_count,
             reply_users_count = EXCLUDED.reply_users_count,
             reactions_rate = EXCLUDED.reactions_rate,
-            thread_length = EXCLUDED.thread_length;
+            thread_length = EXCLUDED.thread_length,
+            thread_ts = EXCLUDED.thread_ts;
         """
         sequence = self.__make_insert_values_from_messages_array(messages)
         await self.engine.make_execute_many(request, sequence)
 
-    async def get_messages_without_links(self) -> List[Message]:
-        request = f"SELECT * FROM message WHERE link IS NULL;"
-
-        messages = await self.engine.make_fetch_rows(request)
-        return self.__request_messages_to_message_class(messages)
+    async def __copy_upsert_messages(self, messages: List[Message]) -> None:
+        """
+        Bulk upsert: messages are copied into a temporary table and merged by one statement.
+        Timestamps are cast to DECIMAL by Postgres, the last message wins if the same message is sent twice
+        (as with row by row upsert).
+        """
+        definition = """
+            position INTEGER NOT NULL,
+            username TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            reply_count INTEGER NOT NULL,
+            reply_users_count INTEGER NOT NULL,
+            reactions_rate FLOAT,
+            thread_length INTEGER NOT NULL,
+            channel_id TEXT NOT NULL,
+            thread_ts TEXT
+        """
+        columns = [
+            "position", "username", "timestamp", "reply_count", "reply_users_count",
+            "reactions_rate", "thread_length", "channel_id", "thread_ts"
+        ]
+        records = (
+            (
+                position,
+                message.username,
+                message.timestamp,
+                message.reply_count,
+                message.reply_users_count,
+                message.reactions_rate,
+                message.thread_length,
+                message.channel_id,
+                message.thread_ts,
+            )
+            for position, message in enumerate(messages)
+        )
+        request = """
+        INSERT INTO message (username, timestamp, reply_count, reply_users_count,
+                            reactions_rate, thread_length, channel_id, thread_ts)
+        SELECT DISTINCT ON (channel_id, timestamp)
+            username, timestamp, reply_count, reply_users_count, reactions_rate, thread_length, channel_id, thread_ts
+        FROM (
+            SELECT position, username, timestamp::DECIMAL AS timestamp, reply_count, reply_users_count,
+                   reactions_rate, thread_length, channel_id, thread_ts
+            FROM message_upload
+        ) upload
+        ORDER BY channel_id, timestamp, position DESC
+        ON CONFLICT (timestamp, channel_id)
+        DO UPDATE SET
+            reply_count = EXCLUDED.reply_count,
+            reply_users_count = EXCLUDED.reply_users_count,
+            reactions_rate = EXCLUDED.reactions_rate,
+            thread_length = EXCLUDED.thread_length,
+            thread_ts = EXCLUDED.thread_ts;
+        """
+        await self.engine.make_copy_and_execute("message_upload", definition, records, columns, request)
 
-    async def update_message_links(self, messages: List[Message]) -> None:
-        request = f" UPDATE message SET link=($1) WHERE timestamp=($2) AND channel_id=($3)"
+    async def insert_new_messages(self, messages: List[Message]) -> None:
+        """
+        Insert messages, leaving already existing ones untouched (crawled statistics are not reset)
+        """
+        request = """
+        INSERT INTO message (username, timestamp, reply_count, reply_users_count,
+                            reactions_rate, thread_length, channel_id, thread_ts)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        ON CONFLICT (timestamp, channel_id) DO NOTHING;
+        """
+        sequence = self.__make_insert_values_from_messages_array(messages)
+        await self.engine.make_execute_many(request, sequence)
+        await self.top.notify_change()
 
-        sequence = self.__make_link_update_values_from_messages_array(messages)
+    async def apply_message_deltas(self, deltas: List[MessageDelta]) -> None:
+        """
+        Add incremental changes to statistics of existing messages, unknown messages are skipped
+        """
+        request = """
+        UPDATE message SET
+            reply_count = reply_count + $1,
+            reply_users_count = GREATEST(reply_users_count, COALESCE($2, 0)),
+            thread_length = thread_length + $3,
+            reactions_rate = GREATEST(reactions_rate + $4, 0)
+        WHERE timestamp = $5 AND channel_id = $6;
+        """
+        sequence = [
+            (x.reply_count, x.reply_users_count, x.thread_length, x.reactions_rate, Decimal(x.timestamp), x.channel_id)
+            for x in deltas
+        ]
         await self.engine.make_execute_many(request, sequence)
+        await self.top.notify_change()
+
+    async def get_messages_without_links(
+            self,
+            limit: int,
+            after: Optional[Tuple[str, str]] = None,
+            raw: bool = False
+    ) -> Union[List[Message], List[Record]]:
+        """
+        Page of messages without links, the newest first
+
+        :param limit: page size
+        :param after: (timestamp, channel_id) of the last message of the previous page, the first page if None
+        :param raw: return database rows instead of models (for direct encoding)
+        """
+        if after is None:
+            request = """
+            SELECT * FROM message WHERE link IS NULL
+            ORDER BY timestamp DESC, channel_id DESC
+            LIMIT $1;
+            """
+            messages = await self.engine.make_fetch_rows(request, limit)
+        else:
+            request = """
+            SELECT * FROM message WHERE link IS NULL AND (timestamp, channel_id) < ($2::TEXT::DECIMAL, $3)
+            ORDER BY timestamp DESC, channel_id DESC
+            LIMIT $1;
+            """
+            messages = await self.engine.make_fetch_rows(request, limit, *after)
+        return messages if raw else self.__request_messages_to_message_class(messages)
+
+    async def update_message_links(self, messages: List[Message]) -> int:
+        """
+        Set links of messages by one statement joined with arrays of new values
+
+        :return: number of updated messages
+        """
+        request = """
+        UPDATE message SET link = updates.link
+        FROM unnest($1::TEXT[], $2::TEXT[], $3::TEXT[]) AS updates (link, timestamp, channel_id)
+        WHERE message.timestamp = updates.timestamp::DECIMAL AND message.channel_id = updates.channel_id;
+        """
+
+        status = await self.engine.make_execute(
+            request,
+            [x.link for x in messages],
+            [x.timestamp for x in messages],
+            [x.channel_id for x in messages],
+        )
+        await self.top.notify_change()
+        return int(status.split()[-1])  # "UPDATE <count>"
 
     async def get_top_messages(
             self,
-            after_ts: str,
+            after: datetime,
             user_id: str,
             sorting_type: SortingType = SortingType.REPLIES,
-            top_count: int = 10
-    ) -> List[Message]:
+            top_count: int = 10,
+            raw: bool = False
+    ) -> Union[List[Message], List[Record]]:
+        if self.__rollups_applicable(after, top_count):
+            messages = await self.__get_top_messages_from_rollups(after, user_id, sorting_type, top_count)
+            if messages is not None:
+                return messages if raw else self.__request_messages_to_message_class(messages)
+
+        ignore_filter, ignore_arg = await self.__make_ignore_filter(user_id, 3)
         request = f"""
             SELECT * FROM message
-            WHERE timestamp >= $1 AND username NOT IN 
-                (SELECT ignore_username FROM IgnoreList WHERE author_username = $3)
+            WHERE posted_at >= $1 AND {ignore_filter}
             ORDER BY {sorting_type.value} DESC
             LIMIT $2;
         """
 
-        messages = await self.engine.make_fetch_rows(request, after_ts, top_count, user_id)
-        return self.__request_messages_to_message_class(messages)
+        messages = await self.engine.make_fetch_rows(request, after, top_count, ignore_arg)
+        return messages if raw else self.__request_messages_to_message_class(messages)
 
     async def get_top_messages_by_channel_id(
             self,
             channel_id: str,
-            after_ts: str,
+            after: datetime,
             user_id: str,
             sorting_type: SortingType = SortingType.REPLIES,
             top_count: int = 10,
-    ) -> List[Message]:
+            raw: bool = False
+    ) -> Union[List[Message], List[Record]]:
+        if self.__rollups_applicable(after, top_count):
+            messages = await self.__get_top_messages_from_rollups(
+                after, user_id, sorting_type, top_count, channel_ids=[channel_id]
+            )
+            if messages is not None:
+                return messages if raw else self.__request_messages_to_message_class(messages)
+
+        ignore_filter, ignore_arg = await self.__make_ignore_filter(user_id, 4)
         request = f"""
             SELECT * FROM message
             WHERE
                 channel_id=$1
             AND
-                timestamp >= $2
+                posted_at >= $2
             AND
-                username NOT IN (SELECT ignore_username FROM IgnoreList WHERE author_username = $4)
+                {ignore_filter}
             ORDER BY {sorting_type.value} DESC
             LIMIT $3;
         """
 
         messages = await self.engine.make_fetch_rows(
-            request, channel_id, after_ts, top_count, user_id
+            request, channel_id, after, top_count, ignore_arg
         )
-        return self.__request_messages_to_message_class(messages)
+        return messages if raw else self.__request_messages_to_message_class(messages)
 
     async def get_top_messages_by_preset_name(
             self,
             preset_name: str,
-            after_ts: str,
+            after: datetime,
             user_id: str,
             sorting_type: SortingType = SortingType.REPLIES,
             top_count: int = 10,
-    ) -> List[Message]:
+            raw: bool = False
+    ) -> Union[List[Message], List[Record]]:
+        if self.__rollups_applicable(after, top_count):
+            channel_ids = await self.__get_preset_channel_ids(preset_name, user_id)
+            if channel_ids is not None:
+                messages = await self.__get_top_messages_from_rollups(
+                    after, user_id, sorting_type, top_count, channel_ids=channel_ids
+                )
+                if messages is not None:
+                    return messages if raw else self.__request_messages_to_message_class(messages)
+
+        ignore_filter, ignore_arg = await self.__make_ignore_filter(user_id, 5)
         request = f"""
             WITH presets AS (
                 SELECT *
@@ -133,16 +444,22 @@ class MessageDAO:
             SELECT message.* FROM message
                 JOIN presets preset
                 ON message.channel_id=ANY(preset.channel_ids)
-                WHERE message.timestamp >= $3 AND message.username NOT IN
-                    (SELECT ignore_username FROM IgnoreList WHERE author_username = $2)
+                WHERE message.posted_at >= $3 AND {ignore_filter}
                 ORDER BY {sorting_type.value} DESC
                 LIMIT $4;
         """
 
         messages = await self.engine.make_fetch_rows(
-            request, preset_name, user_id, after_ts, top_count
+            request, preset_name, user_id, after, top_count, ignore_arg
         )
-        return self.__request_messages_to_message_class(messages)
+        return messages if raw else self.__request_messages_to_message_class(messages)
 
 
-message_dao = MessageDAO(db_engine)
+message_dao = MessageDAO(
+    db_engine,
+    ignore_dao,
+    top_cache,
+    rollup_size=ROLLUP_SIZE,
+    rollup_min_window=ROLLUP_MIN_WINDOW,
+    copy_threshold=UPSERT_COPY_THRESHOLD
+)
@@ -1,30 +1,35 @@
-from typing import List, Any, Optional
+from typing import List, Any, Optional, Union
+
+from asyncpg import Record
 
 from models import Preset
 from .engine import db_engine, DBEngine
+from .topcache import top_cache, TopCache
 
 
 class PresetDAO:
-    def __init__(self, engine: DBEngine):
+    def __init__(self, engine: DBEngine, top: TopCache):
         self.engine = engine
+        self.top = top
 
     @staticmethod
     def __request_presets_to_preset_class(request_presets: List[Any]) -> List[Preset]:
         return [Preset(**p) for p in request_presets]
 
-    async def get_all_presets(self) -> List[Preset]:
+    async def get_all_presets(self, raw: bool = False) -> Union[List[Preset], List[Record]]:
         request = f"SELECT * FROM preset;"
         presets = await self.engine.make_fetch_rows(request)
-        presets = self.__request_presets_to_preset_class(presets)
-        return presets
+        return presets if raw else self.__request_presets_to_preset_class(presets)
 
-    async def get_preset_by_name(self, name) -> List[Preset]:
-        request = f"SELECT * FROM preset WHERE name='{name}';"
+    async def get_preset_by_name(self, name: str, raw: bool = False) -> Union[List[Preset], List[Record]]:
+        request = "SELECT * FROM preset WHERE name = $1"
 
-        presets_base = await self.engine.make_fetch_rows(request)
-        return self.__request_presets_to_preset_class(presets_base)
+        presets_base = await self.engine.make_fetch_rows(request, name)
+        return presets_base if raw else self.__request_presets_to_preset_class(presets_base)
 
-    async def get_presets(self, user_id: Optional[str], include_global: bool = True) -> List[Preset]:
+    async def get_presets(
+            self, user_id: Optional[str], include_global: bool = True, raw: bool = False
+    ) -> Union[List[Preset], List[Record]]:
         user_query = "SELECT * FROM preset WHERE username = $1"
         global_query = "SELECT * FROM preset WHERE username IS NULL"
         union_query = f"{user_query} UNION ALL {global_query}"
@@ -36,7 +41,7 @@ class PresetDAO:
         else:
             result = await self.engine.make_fetch_rows(user_query, user_id)
 
-        return self.__request_presets_to_preset_class(result)
+        return result if raw else self.__request_presets_to_preset_class(result)
 
     async def add_or_update_preset(
             self,
@@ -55,6 +60,7 @@ class PresetDAO:
                     RETURNING *"""
 
         result = await self.engine.make_fetch_rows(query, user_id, name, channels, max_user_presets_count)
+        await self.top.notify_change()
         result = self.__request_presets_to_preset_class(result)
         return result[0] if result else None
 
@@ -62,6 +68,7 @@ class PresetDAO:
         query = "DELETE FROM preset WHERE username = $1 AND name = $2 RETURNING *"
 
         result = await self.engine.make_fetch_rows(query, user_id, name)
+        await self.top.notify_change()
         result = self.__request_presets_to_preset_class(result)
         return result[0] if result else None
 
@@ -70,4 +77,4 @@ class PresetDAO:
         return await self.engine.make_fetchval(query)
 
 
-preset_dao = PresetDAO(db_engine)
+preset_dao = PresetDAO(db_engine, top_cache)
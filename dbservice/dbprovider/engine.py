@@ -1,13 +1,18 @@
+from typing import Callable, Iterable, List
+
 import asyncpg
 
 import config
 from common.LoggerFactory import create_logger
+from .indexes import message_index_statements, obsolete_message_indexes
+from .rollups import rollup_statements
 
 
 class DBEngine:
     def __init__(self):
         self.logger = create_logger("dbengine", config.LOG_LEVEL)
         self.pool = None
+        self.listener = None
 
     async def ainit(self):
         self.pool = await asyncpg.create_pool(
@@ -68,6 +73,17 @@ class DBEngine:
                     link TEXT NULL,
                     PRIMARY KEY(channel_id, timestamp)
                 );
+
+                -- timestamp (Slack ts) identifies messages, posted_at is used for time ranges
+                ALTER TABLE Message ADD COLUMN IF NOT EXISTS posted_at TIMESTAMP WITH TIME ZONE
+                    GENERATED ALWAYS AS (to_timestamp(timestamp::DOUBLE PRECISION)) STORED;
+
+                -- timestamp of the parent message if the message is a thread reply shown in the channel
+                ALTER TABLE Message ADD COLUMN IF NOT EXISTS thread_ts TEXT NULL;
+
+                -- pages of messages waiting for permalinks, newest first
+                CREATE INDEX IF NOT EXISTS message_linkless_idx ON Message (timestamp DESC, channel_id DESC)
+                    WHERE link IS NULL;
             """,
             """CREATE TABLE IF NOT EXISTS IgnoreList ( 
                     author_username TEXT NOT NULL,
@@ -76,8 +92,26 @@ class DBEngine:
                 );
     
                 CREATE INDEX IF NOT EXISTS author_name_idx ON IgnoreList (author_username);
+            """,
+            """CREATE TABLE IF NOT EXISTS CrawlState (
+                    channel_id TEXT NOT NULL PRIMARY KEY,
+                    last_ts DECIMAL NOT NULL DEFAULT 0,  -- newest message timestamp seen in the channel
+                    last_reply DECIMAL NOT NULL DEFAULT 0  -- newest thread reply timestamp seen in the channel
+                );
+
+                ALTER TABLE CrawlState ADD COLUMN IF NOT EXISTS next_crawl TIMESTAMP WITHOUT TIME ZONE NULL;
+                ALTER TABLE CrawlState ADD COLUMN IF NOT EXISTS crawl_interval INTEGER NULL;  -- seconds
+                ALTER TABLE CrawlState ADD COLUMN IF NOT EXISTS last_full_crawl TIMESTAMP WITHOUT TIME ZONE NULL;
+                -- crawler replica crawling the channel
+                ALTER TABLE CrawlState ADD COLUMN IF NOT EXISTS lease_owner TEXT NULL;
+                ALTER TABLE CrawlState ADD COLUMN IF NOT EXISTS lease_expires TIMESTAMP WITHOUT TIME ZONE NULL;
+
+                CREATE INDEX IF NOT EXISTS crawl_state_next_crawl_idx ON CrawlState (next_crawl NULLS FIRST);
             """
         ]
+        tables.append(f"DROP INDEX IF EXISTS {', '.join(obsolete_message_indexes())};")
+        tables.extend(message_index_statements())
+        tables.extend(rollup_statements(config.ROLLUP_SIZE))
 
         big_query = "\n".join(tables)
 
@@ -101,6 +135,28 @@ class DBEngine:
         async with self.pool.acquire() as connection:
             return await connection.executemany(request_string, sequence)
 
+    async def make_copy_and_execute(
+            self,
+            table: str,
+            definition: str,
+            records: Iterable[tuple],
+            columns: List[str],
+            request_string: str
+    ):
+        """
+        Copy records into a new temporary table and execute request (which reads the table) in one transaction
+        :param table: name of the temporary table, it's dropped on commit
+        :param definition: columns of the temporary table (as in CREATE TABLE)
+        :param records: rows of the temporary table
+        :param columns: names of columns which records contain
+        :param request_string: request string
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute(f"CREATE TEMPORARY TABLE {table} ({definition}) ON COMMIT DROP;")
+                await connection.copy_records_to_table(table, records=records, columns=columns)
+                return await connection.execute(request_string)
+
     async def make_fetch_rows(self, request_string: str, *args):
         """
         Fetch request
@@ -121,10 +177,28 @@ class DBEngine:
         async with self.pool.acquire() as connection:
             return await connection.fetchval(request_string, *args)
 
+    async def listen(self, channel: str, callback: Callable[[str], None]) -> None:
+        """
+        Call callback with payload of every notification sent to the channel (NOTIFY from any worker or service)
+        :param channel: notification channel name
+        :param callback: function accepting notification payload
+        """
+        if self.listener is None:
+            self.listener = await asyncpg.connect(
+                user=config.DB_USER,
+                password=config.DB_PASS,
+                database=config.DB_NAME,
+                host=config.DB_HOST,
+                port=config.DB_PORT
+            )
+        await self.listener.add_listener(channel, lambda connection, pid, ch, payload: callback(payload))
+
     async def close(self):
         """
         Close all connection with database
         """
+        if self.listener is not None:
+            await self.listener.close()
         await self.pool.close()
 
 
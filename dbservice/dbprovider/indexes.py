@@ -0,0 +1,41 @@
+from typing import List
+
+from common.Enums import SortingType
+
+
+def message_index_statements(table: str = "Message") -> List[str]:
+    """
+    Indexes for top queries, created idempotently:
+        * (posted_at) - narrow windows over all channels: only rows of the window are read and sorted
+        * (<sorting> DESC, posted_at) - wide windows over all channels: rows are read in the requested order
+          and the scan stops after top_count rows of the window
+        * (channel_id, <sorting> DESC, posted_at) - the same for one channel or channels of a preset
+    Narrow windows of one channel are served by the primary key (channel_id, timestamp) or (posted_at).
+
+    :param table: name of the message table
+    :return: list of CREATE INDEX statements
+    """
+    statements = [f"CREATE INDEX IF NOT EXISTS {table.lower()}_posted_at_idx ON {table} (posted_at);"]
+    for sorting_type in SortingType:
+        column = sorting_type.value
+        statements.extend([
+            f"CREATE INDEX IF NOT EXISTS {table.lower()}_{column}_posted_at_idx "
+            f"ON {table} ({column} DESC, posted_at);",
+            f"CREATE INDEX IF NOT EXISTS {table.lower()}_channel_{column}_posted_at_idx "
+            f"ON {table} (channel_id, {column} DESC, posted_at);",
+        ])
+    return statements
+
+
+def obsolete_message_indexes(table: str = "Message") -> List[str]:
+    """
+    :param table: name of the message table
+    :return: names of replaced top indexes (on the DECIMAL timestamp), they are dropped on migration
+    """
+    names = [f"{table.lower()}_timestamp_idx"]
+    for sorting_type in SortingType:
+        names.extend([
+            f"{table.lower()}_{sorting_type.value}_idx",
+            f"{table.lower()}_channel_{sorting_type.value}_idx",
+        ])
+    return names
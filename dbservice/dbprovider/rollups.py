@@ -0,0 +1,126 @@
+from typing import List
+
+from common.Enums import SortingType
+
+BUCKET_SECONDS = 3600  # rollups are kept per channel and hour
+REFRESH_BATCH = 1000  # how many changed buckets are recomputed in one transaction
+
+
+def rollup_statements(size: int) -> List[str]:
+    """
+    Rollup tables, created idempotently:
+        * MessageRollup - best `size` messages of every (sorting type, channel, hour) bucket with their sorting value
+          and position in the bucket, so top requests over long windows merge buckets instead of scanning messages
+        * RollupDirty - buckets changed since their last refresh, filled by triggers on Message;
+          top requests read such buckets from Message until they are refreshed
+    All buckets are marked as changed if rollups are empty (first start), so they are filled by refreshes.
+    If rollups are turned off (size is 0), triggers are dropped and rollups are emptied.
+
+    :param size: how many messages are kept in every bucket
+    :return: list of SQL statements
+    """
+    statements = [
+        """CREATE TABLE IF NOT EXISTS MessageRollup (
+                sorting TEXT NOT NULL,  -- sorting column name
+                channel_id TEXT NOT NULL,
+                hour BIGINT NOT NULL,  -- floor(timestamp / 3600)
+                timestamp DECIMAL NOT NULL,
+                username TEXT NOT NULL,
+                value DOUBLE PRECISION,
+                position INTEGER NOT NULL,  -- 1 for the best message of the bucket
+                PRIMARY KEY(channel_id, hour, sorting, timestamp)
+            );
+
+            -- rollup rows are read in the requested order, the scan stops after top_count rows of the window
+            CREATE INDEX IF NOT EXISTS message_rollup_value_idx ON MessageRollup (sorting, value DESC, hour);
+            DROP INDEX IF EXISTS message_rollup_hour_idx;
+        """,
+        """CREATE TABLE IF NOT EXISTS RollupDirty (
+                channel_id TEXT NOT NULL,
+                hour BIGINT NOT NULL,
+                PRIMARY KEY(channel_id, hour)
+            );
+
+            CREATE INDEX IF NOT EXISTS rollup_dirty_hour_idx ON RollupDirty (hour);
+        """,
+        f"""CREATE OR REPLACE FUNCTION mark_rollup_dirty() RETURNS TRIGGER AS $$
+            BEGIN
+                INSERT INTO RollupDirty (channel_id, hour)
+                VALUES (NEW.channel_id, floor(NEW.timestamp / {BUCKET_SECONDS})::BIGINT)
+                ON CONFLICT DO NOTHING;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS message_rollup_insert ON Message;
+            DROP TRIGGER IF EXISTS message_rollup_update ON Message;
+        """,
+    ]
+    if size <= 0:
+        statements.append("TRUNCATE MessageRollup, RollupDirty;")
+        return statements
+
+    columns = [x.value for x in SortingType]
+    old_values = ", ".join(f"OLD.{x}" for x in columns)
+    new_values = ", ".join(f"NEW.{x}" for x in columns)
+    statements.extend([
+        # link updates and upserts with unchanged statistics don't invalidate rollups
+        f"""CREATE TRIGGER message_rollup_insert AFTER INSERT ON Message
+                FOR EACH ROW EXECUTE PROCEDURE mark_rollup_dirty();
+            CREATE TRIGGER message_rollup_update AFTER UPDATE OF {", ".join(columns)} ON Message
+                FOR EACH ROW WHEN (({old_values}) IS DISTINCT FROM ({new_values}))
+                EXECUTE PROCEDURE mark_rollup_dirty();
+        """,
+        f"""INSERT INTO RollupDirty (channel_id, hour)
+                SELECT DISTINCT channel_id, floor(timestamp / {BUCKET_SECONDS})::BIGINT FROM Message
+                WHERE NOT EXISTS (SELECT 1 FROM MessageRollup)
+                ON CONFLICT DO NOTHING;
+        """,
+    ])
+    return statements
+
+
+def rollup_refresh_statement(size: int, batch: int = REFRESH_BATCH) -> str:
+    """
+    Recompute up to `batch` changed buckets, the newest first. Statements are run in one transaction
+    (simple query protocol), concurrent refreshes take different buckets. Status of the last statement
+    is "DELETE <number of refreshed buckets>".
+
+    :param size: how many messages are kept in every bucket
+    :param batch: how many buckets are refreshed
+    :return: SQL script without parameters
+    """
+    values = ", ".join(f"('{x.value}', m.{x.value}::DOUBLE PRECISION)" for x in SortingType)
+    return f"""
+        CREATE TEMP TABLE IF NOT EXISTS refreshed_buckets (channel_id TEXT NOT NULL, hour BIGINT NOT NULL);
+
+        WITH taken AS (
+            SELECT channel_id, hour FROM RollupDirty
+            ORDER BY hour DESC
+            LIMIT {int(batch)}
+            FOR UPDATE SKIP LOCKED
+        ), removed AS (
+            DELETE FROM RollupDirty d USING taken t
+            WHERE d.channel_id = t.channel_id AND d.hour = t.hour
+            RETURNING d.channel_id, d.hour
+        )
+        INSERT INTO refreshed_buckets SELECT channel_id, hour FROM removed;
+
+        DELETE FROM MessageRollup r USING refreshed_buckets b
+        WHERE r.channel_id = b.channel_id AND r.hour = b.hour;
+
+        INSERT INTO MessageRollup (sorting, channel_id, hour, timestamp, username, value, position)
+        SELECT * FROM (
+            SELECT
+                s.sorting, m.channel_id, b.hour, m.timestamp, m.username, s.value,
+                row_number() OVER (PARTITION BY s.sorting, m.channel_id, b.hour ORDER BY s.value DESC) AS position
+            FROM refreshed_buckets b
+            JOIN Message m
+                ON m.channel_id = b.channel_id
+                AND m.timestamp >= b.hour * {BUCKET_SECONDS} AND m.timestamp < (b.hour + 1) * {BUCKET_SECONDS}
+            CROSS JOIN LATERAL (VALUES {values}) AS s(sorting, value)
+        ) ranked
+        WHERE position <= {int(size)};
+
+        DELETE FROM refreshed_buckets;
+    """
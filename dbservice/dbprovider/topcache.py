@@ -0,0 +1,92 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, Optional
+
+from common.utils.cache import LRUCache
+from config import TOP_CACHE_SIZE, TOP_CACHE_ROUNDING
+from .engine import db_engine, DBEngine
+
+# changes of messages and presets are broadcast to all dbservice workers through this notification channel
+TOP_CHANNEL = "top_results_changed"
+
+
+class TopCache:
+    """
+    Results of top requests shared by identical requests until messages or presets change in any worker.
+    Every write request invalidates the cache once (a streamed upsert - at its end, not on every chunk).
+    Ignore lists are a part of keys, so their changes lead to new entries instead of invalidation.
+    """
+
+    def __init__(self, engine: DBEngine, size: int = 0, rounding: int = 60):
+        self.engine = engine
+        self.rounding = rounding
+        self.cache = LRUCache(maxsize=size)
+        # bumped on every invalidation, results computed before it are not cached
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.cache.maxsize > 0
+
+    async def listen_for_changes(self) -> None:
+        """
+        Invalidate the cache on changes made by other workers
+        """
+        if self.enabled:
+            await self.engine.listen(TOP_CHANNEL, self.invalidate)
+
+    def round_after(self, after: datetime) -> datetime:
+        """
+        Round the window start up, so requests made within TOP_CACHE_ROUNDING seconds have the same key.
+        The window is never widened: messages posted in the first seconds of the window may be left out.
+        """
+        if not self.enabled or self.rounding <= 0:
+            return after
+        timestamp = after.timestamp()
+        return datetime.fromtimestamp(timestamp + (-timestamp) % self.rounding, tz=timezone.utc)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        result = self.cache.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    def put(self, key: Hashable, result: Any, generation: int) -> None:
+        """
+        :param generation: generation taken before the result was requested from the database
+        """
+        if generation == self.generation:
+            self.cache.put(key, result)
+
+    def invalidate(self, payload: Optional[str] = None) -> None:
+        self.generation += 1
+        self.invalidations += 1
+        self.cache.clear()
+
+    async def notify_change(self) -> None:
+        """
+        Invalidate the cache in this and all other workers
+        """
+        if self.enabled:
+            self.invalidate()
+            await self.engine.make_execute("SELECT pg_notify($1, '')", TOP_CHANNEL)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.cache),
+            "max_size": self.cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+top_cache = TopCache(db_engine, size=TOP_CACHE_SIZE, rounding=TOP_CACHE_ROUNDING)
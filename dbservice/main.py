@@ -1,27 +1,58 @@
-from asyncio import get_event_loop
+from asyncio import get_event_loop, create_task, sleep
 
 import uvicorn
 from asyncpg.exceptions import PostgresError
 
 from fastapi import FastAPI, Request, HTTPException
 
+from config import ROLLUP_REFRESH_INTERVAL
+from dbprovider.IgnoreDAO import ignore_dao
+from dbprovider.MessageDAO import message_dao
+from dbprovider.rollups import REFRESH_BATCH
+from dbprovider.topcache import top_cache
 from dbprovider.engine import db_engine
-from routers import timer, preset, message, ignore
+from routers import timer, preset, message, ignore, crawl_state
 
 app = FastAPI()
 app.include_router(timer.router, prefix="/timer", tags=['timer'])
 app.include_router(preset.router, prefix="/preset", tags=['preset'])
 app.include_router(message.router, prefix="/message", tags=['message'])
 app.include_router(ignore.router, prefix="/ignore", tags=["ignore"])
+app.include_router(crawl_state.router, prefix="/crawl_state", tags=["crawl_state"])
+
+
+rollup_task = None
+
+
+async def refresh_rollups():
+    """
+    Periodically recompute rollups of changed hours (workers refresh different hours concurrently)
+    """
+    while True:
+        try:
+            # full batches mean there are more changed hours (e.g. rollups are filled on the first start)
+            while await message_dao.refresh_rollups() >= REFRESH_BATCH:
+                pass
+        except PostgresError as e:
+            db_engine.logger.error("Couldn't refresh message rollups")
+            db_engine.logger.exception(e)
+        await sleep(ROLLUP_REFRESH_INTERVAL)
 
 
 @app.on_event("startup")
 async def startup():
+    global rollup_task
     await db_engine.ainit()
+    await ignore_dao.listen_for_changes()
+    await top_cache.listen_for_changes()
+    if message_dao.rollup_size > 0:
+        rollup_task = create_task(refresh_rollups())
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    if rollup_task is not None:
+        rollup_task.cancel()
     await db_engine.close()
 
 
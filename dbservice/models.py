@@ -1,7 +1,7 @@
 from pydantic import Field
 from typing import Optional
 
-from common.models import Preset, Message, Timer
+from common.models import Preset, Message, MessageDelta, Timer, CrawlState
 
 
 # noinspection PyRedeclaration
@@ -17,6 +17,18 @@ class Message(Message):
     link: Optional[str] = None
 
 
+# noinspection PyRedeclaration
+class MessageDelta(MessageDelta):
+    reply_count: int = Field(0, ge=0)
+    reply_users_count: Optional[int] = Field(None, ge=0)
+    thread_length: int = Field(0, ge=0)
+
+
 # noinspection PyRedeclaration
 class Timer(Timer):
     pass
+
+
+# noinspection PyRedeclaration
+class CrawlState(CrawlState):
+    pass
@@ -0,0 +1,46 @@
+from models import CrawlState
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Query
+
+from dbprovider.CrawlStateDAO import crawl_state_dao
+
+router = APIRouter()
+
+
+@router.get("/", response_model=List[CrawlState])
+async def get_crawl_states(channel_id: Optional[str] = None):
+    return await crawl_state_dao.get_crawl_states(channel_id)
+
+
+@router.put("/")
+async def upsert_crawl_states(states: List[CrawlState]):
+    return await crawl_state_dao.upsert_crawl_states(states)
+
+
+@router.put("/channels")
+async def register_channels(channel_ids: List[str] = Body(...)):
+    return await crawl_state_dao.register_channels(channel_ids)
+
+
+@router.post("/claim", response_model=List[CrawlState])
+async def claim_crawl_states(
+        owner: str,
+        limit: int = Query(default=10, ge=1),
+        lease_seconds: float = Query(..., gt=0),
+):
+    return await crawl_state_dao.claim_crawl_states(owner, limit, lease_seconds)
+
+
+@router.post("/heartbeat", response_model=List[str])
+async def heartbeat_crawl_states(
+        owner: str,
+        lease_seconds: float = Query(..., gt=0),
+        channel_ids: List[str] = Body(...),
+):
+    return await crawl_state_dao.heartbeat_crawl_states(owner, channel_ids, lease_seconds)
+
+
+@router.post("/release")
+async def release_crawl_states(owner: str, states: List[CrawlState]):
+    return await crawl_state_dao.release_crawl_states(owner, states)
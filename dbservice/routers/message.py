@@ -1,13 +1,45 @@
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
 from common.Enums import SortingType
-from models import Message
-from typing import List, Optional
+from config import INGEST_CHUNK_SIZE, FAST_JSON
+from models import Message, MessageDelta
+from typing import List, Optional, AsyncGenerator, Union
 
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request
+from pydantic import ValidationError
 
+from dbprovider.IgnoreDAO import ignore_dao
 from dbprovider.MessageDAO import message_dao
+from dbprovider.topcache import top_cache
+from serialization import RowsResponse, encode_rows
 
 router = APIRouter()
 
+MESSAGE_FIELDS = tuple(Message.__fields__)
+
+
+async def __read_ndjson_chunks(request: Request, chunk_size: int) -> AsyncGenerator[List[Message], None]:
+    """
+    Read newline-delimited JSON messages from the request body as it arrives and yield them in chunks
+    """
+    chunk = []
+    buffer = b""
+    async for data in request.stream():
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                chunk.append(Message.parse_raw(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+    if buffer.strip():
+        chunk.append(Message.parse_raw(buffer))
+    if chunk:
+        yield chunk
+
 
 @router.post("/")
 async def insert_messages(messages: List[Message]):
@@ -19,46 +51,167 @@ async def upsert_messages(messages: List[Message]):
     return await message_dao.upsert_messages(messages)
 
 
+@router.put("/stream")
+async def upsert_messages_stream(request: Request):
+    """
+    Upsert messages sent as newline-delimited JSON, chunk by chunk while the body is still being received
+    """
+    written = 0
+    try:
+        async for chunk in __read_ndjson_chunks(request, INGEST_CHUNK_SIZE):
+            await message_dao.upsert_messages(chunk, notify=False)
+            written += len(chunk)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=f"Messages written before the error: {written}. {e}")
+    finally:
+        # cached top results are dropped once for the whole stream
+        if written:
+            await top_cache.notify_change()
+
+    return {"written": written}
+
+
+@router.post("/events")
+async def insert_event_messages(messages: List[Message]):
+    """
+    Insert new messages received from Slack events, messages that are already stored are left untouched
+    """
+    return await message_dao.insert_new_messages(messages)
+
+
+@router.patch("/events")
+async def apply_message_deltas(deltas: List[MessageDelta]):
+    """
+    Apply incremental statistics changes received from Slack events
+    """
+    return await message_dao.apply_message_deltas(deltas)
+
+
 @router.get("/linkless", response_model=List[Message])
-async def get_linkless_messages():
-    return await message_dao.get_messages_without_links()
+async def get_linkless_messages(
+        limit: int = Query(default=1000, ge=1, le=10000),
+        after: Optional[str] = None,
+):
+    """
+    Page of messages without links, the newest first
+
+    :param limit: page size
+    :param after: cursor "<timestamp>,<channel_id>" of the last message of the previous page
+    """
+    cursor = None
+    if after is not None:
+        timestamp, separator, channel_id = after.partition(",")
+        try:
+            Decimal(timestamp)
+        except InvalidOperation:
+            separator = ""
+        if not separator:
+            raise HTTPException(status_code=400, detail=f"Wrong cursor: {after}")
+        cursor = (timestamp, channel_id)
+
+    if FAST_JSON:
+        rows = await message_dao.get_messages_without_links(limit=limit, after=cursor, raw=True)
+        return RowsResponse(encode_rows(rows, MESSAGE_FIELDS))
+    return await message_dao.get_messages_without_links(limit=limit, after=cursor)
 
 
 @router.patch("/links")
 async def update_message_links(messages: List[Message]):
-    return await message_dao.update_message_links(messages)
+    """
+    Set permalinks of messages
 
+    :return: number of stored messages which were updated
+    """
+    return {"matched": await message_dao.update_message_links(messages)}
 
-@router.get("/top", response_model=List[Message])
-async def get_top_messages(
-        after_ts: str,
+
+async def __get_top_messages(
+        after: datetime,
         user_id: str,
-        channel_id: Optional[str] = None,
-        preset_name: Optional[str] = None,
-        sorting_type: SortingType = SortingType.REPLIES,
-        top_count: int = Query(default=10, ge=1),
-):
+        channel_id: Optional[str],
+        preset_name: Optional[str],
+        sorting_type: SortingType,
+        top_count: int,
+) -> Union[List[Message], bytes]:
+    """
+    :return: top messages, already encoded to JSON if FAST_JSON is set
+    """
     if channel_id is None and preset_name is None:
-        return await message_dao.get_top_messages(
-            after_ts=after_ts, sorting_type=sorting_type, top_count=top_count, user_id=user_id
+        messages = await message_dao.get_top_messages(
+            after=after, sorting_type=sorting_type, top_count=top_count, user_id=user_id, raw=FAST_JSON
         )
-
-    if channel_id is not None and preset_name is None:
-        return await message_dao.get_top_messages_by_channel_id(
+    elif channel_id is not None and preset_name is None:
+        messages = await message_dao.get_top_messages_by_channel_id(
             channel_id=channel_id,
-            after_ts=after_ts,
+            after=after,
             sorting_type=sorting_type,
             top_count=top_count,
-            user_id=user_id
+            user_id=user_id,
+            raw=FAST_JSON,
         )
-
-    if channel_id is None and preset_name is not None:
-        return await message_dao.get_top_messages_by_preset_name(
+    else:
+        messages = await message_dao.get_top_messages_by_preset_name(
             preset_name=preset_name,
-            after_ts=after_ts,
+            after=after,
             sorting_type=sorting_type,
             top_count=top_count,
             user_id=user_id,
+            raw=FAST_JSON,
         )
 
-    raise HTTPException(status_code=400, detail="This combination of parameters is not allowed!")
+    return encode_rows(messages, MESSAGE_FIELDS) if FAST_JSON else messages
+
+
+@router.get("/top", response_model=List[Message])
+async def get_top_messages(
+        user_id: str,
+        after: Optional[datetime] = None,
+        after_ts: Optional[Decimal] = Query(default=None, deprecated=True),
+        channel_id: Optional[str] = None,
+        preset_name: Optional[str] = None,
+        sorting_type: SortingType = SortingType.REPLIES,
+        top_count: int = Query(default=10, ge=1),
+):
+    """
+    Top messages posted since `after` (ISO 8601 datetime, UTC if timezone is not specified)
+    or `after_ts` (Unix timestamp, only for older clients)
+    """
+    if channel_id is not None and preset_name is not None:
+        raise HTTPException(status_code=400, detail="This combination of parameters is not allowed!")
+
+    if after is None and after_ts is None:
+        raise HTTPException(status_code=422, detail="Either after or after_ts must be specified!")
+    if after is None:
+        after = datetime.fromtimestamp(float(after_ts), tz=timezone.utc)
+    elif after.tzinfo is None:
+        after = after.replace(tzinfo=timezone.utc)
+
+    if not top_cache.enabled:
+        messages = await __get_top_messages(after, user_id, channel_id, preset_name, sorting_type, top_count)
+        return RowsResponse(messages) if isinstance(messages, bytes) else messages
+
+    after = top_cache.round_after(after)
+    ignored = await ignore_dao.get_ignored_usernames(user_id)
+    key = (
+        after,
+        sorting_type,
+        top_count,
+        channel_id,
+        preset_name,
+        user_id if preset_name is not None else None,  # presets of users with the same name differ
+        tuple(sorted(ignored)),  # users with the same ignore list share results
+    )
+    messages = top_cache.get(key)
+    if messages is None:
+        generation = top_cache.generation
+        messages = await __get_top_messages(after, user_id, channel_id, preset_name, sorting_type, top_count)
+        top_cache.put(key, messages, generation)
+    return RowsResponse(messages) if isinstance(messages, bytes) else messages
+
+
+@router.get("/top/cache")
+async def get_top_cache_stats():
+    """
+    Hit and miss counters of the top results cache of the worker which serves the request
+    """
+    return top_cache.stats()
@@ -1,12 +1,15 @@
 from dbprovider.PresetDAO import preset_dao
-from config import PRESETS_LIMIT
+from config import PRESETS_LIMIT, FAST_JSON
 from models import Preset
 from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException
+from serialization import RowsResponse, encode_rows
 
 router = APIRouter()
 
+PRESET_FIELDS = tuple(Preset.__fields__)
+
 PARAMETERS_COMBINATION_NOT_ALLOWED = "This combination of parameters is not allowed."
 MAX_PRESETS_REACHED = "Maximum amount of presets reached. Please, remove one of existing presets"
 PRESET_NOT_FOUND = "Could not find preset with name {0}. Please, check name again."
@@ -19,15 +22,15 @@ async def get_presets(
         include_global: Optional[bool] = None
 ):
     if name is None and user_id is None and include_global is None:
-        return await preset_dao.get_all_presets()
-
-    if name is not None and user_id is None and include_global is None:
-        return await preset_dao.get_preset_by_name(name)
-
-    if name is None and include_global is not None:
-        return await preset_dao.get_presets(user_id, include_global)
-
-    raise HTTPException(status_code=400, detail=PARAMETERS_COMBINATION_NOT_ALLOWED)
+        presets = await preset_dao.get_all_presets(raw=FAST_JSON)
+    elif name is not None and user_id is None and include_global is None:
+        presets = await preset_dao.get_preset_by_name(name, raw=FAST_JSON)
+    elif name is None and include_global is not None:
+        presets = await preset_dao.get_presets(user_id, include_global, raw=FAST_JSON)
+    else:
+        raise HTTPException(status_code=400, detail=PARAMETERS_COMBINATION_NOT_ALLOWED)
+
+    return RowsResponse(encode_rows(presets, PRESET_FIELDS)) if FAST_JSON else presets
 
 
 @router.put("/", response_model=Preset)
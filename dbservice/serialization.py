@@ -0,0 +1,35 @@
+"""
+Fast path of list responses: database rows are encoded to JSON bytes directly,
+without building a model per row and validating it again against response_model
+"""
+
+from decimal import Decimal
+from typing import Any, Iterable, Mapping, Sequence
+
+import orjson
+from fastapi.responses import Response
+
+
+def _default(value: Any) -> Any:
+    # types which orjson doesn't encode natively, encoded as pydantic does
+    if isinstance(value, Decimal):
+        return str(value)  # message timestamps are strings in models
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_rows(rows: Iterable[Mapping[str, Any]], fields: Sequence[str]) -> bytes:
+    """
+    Encode rows (asyncpg records or dicts) as a JSON array of objects
+
+    :param rows: rows to encode
+    :param fields: names of encoded columns in the order of model fields, other columns are skipped
+    :return: JSON bytes
+    """
+    return orjson.dumps([{field: row[field] for field in fields} for row in rows], default=_default)
+
+
+class RowsResponse(Response):
+    """
+    Response with JSON bytes produced by encode_rows
+    """
+    media_type = "application/json"
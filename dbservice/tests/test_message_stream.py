@@ -0,0 +1,84 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers import message
+
+MESSAGE = {
+    "username": "U1",
+    "channel_id": "C1",
+    "reply_count": 1,
+    "reply_users_count": 1,
+    "thread_length": 10,
+    "reactions_rate": 0.5,
+}
+
+
+def ndjson(*timestamps: str) -> bytes:
+    return "".join(json.dumps({**MESSAGE, "timestamp": ts}) + "\n" for ts in timestamps).encode()
+
+
+class MessageStreamTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.chunks = []
+        self.notifications = 0
+
+        async def upsert_messages(messages, notify=True):
+            self.assertFalse(notify)
+            self.chunks.append([x.timestamp for x in messages])
+
+        async def notify_change():
+            self.notifications += 1
+
+        app = FastAPI()
+        app.include_router(message.router, prefix="/message")
+        self.client = TestClient(app)
+        self.patches = [
+            patch.object(message.message_dao, "upsert_messages", upsert_messages),
+            patch.object(message, "INGEST_CHUNK_SIZE", 2),
+            patch.object(message.top_cache, "notify_change", notify_change),
+        ]
+        for x in self.patches:
+            x.start()
+
+    def tearDown(self) -> None:
+        for x in self.patches:
+            x.stop()
+
+    def test_messages_upserted_in_chunks(self):
+        body = ndjson("1.1", "1.2", "1.3", "1.4", "1.5")
+
+        def parts():
+            # lines are split between parts of the body
+            for i in range(0, len(body), 37):
+                yield body[i:i + 37]
+
+        answer = self.client.put("/message/stream", content=parts())
+        self.assertEqual(answer.status_code, 200)
+        self.assertEqual(answer.json(), {"written": 5})
+        self.assertEqual(self.chunks, [["1.1", "1.2"], ["1.3", "1.4"], ["1.5"]])
+        self.assertEqual(self.notifications, 1)  # once for the whole stream
+
+    def test_last_line_without_newline(self):
+        answer = self.client.put("/message/stream", content=ndjson("1.1") + ndjson("1.2").rstrip())
+        self.assertEqual(answer.json(), {"written": 2})
+        self.assertEqual(self.chunks, [["1.1", "1.2"]])
+        self.assertEqual(self.notifications, 1)
+
+    def test_malformed_line_rejected(self):
+        body = ndjson("1.1", "1.2") + b"{not json}\n" + ndjson("1.3")
+        answer = self.client.put("/message/stream", content=body)
+        self.assertEqual(answer.status_code, 422)
+        self.assertIn("Messages written before the error: 2", answer.json()["detail"])
+        self.assertEqual(self.chunks, [["1.1", "1.2"]])
+        self.assertEqual(self.notifications, 1)  # messages written before the error are visible
+
+    def test_invalid_message_rejected(self):
+        body = json.dumps({**MESSAGE, "timestamp": "1.1", "reply_count": -1}).encode()
+        answer = self.client.put("/message/stream", content=body)
+        self.assertEqual(answer.status_code, 422)
+        self.assertEqual(self.chunks, [])
+        self.assertEqual(self.notifications, 0)
@@ -0,0 +1,21 @@
+from dbprovider.PresetDAO import PresetDAO
+from dbprovider.topcache import TopCache
+from .test_message_dao import DatabaseTestCase
+
+
+class PresetDAOTest(DatabaseTestCase):
+    """
+    Requests of PresetDAO
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.dao = PresetDAO(self.engine, TopCache(self.engine))
+
+    def test_preset_found_by_name(self):
+        for user_id, name in (("U1", "it's mine"), ("U2", "it's mine"), ("U1", "other")):
+            self.run_async(self.dao.add_or_update_preset(user_id, name, ["C1"], max_user_presets_count=10))
+
+        presets = self.run_async(self.dao.get_preset_by_name("it's mine"))
+        self.assertEqual(sorted(x.username for x in presets), ["U1", "U2"])
+        self.assertEqual(self.run_async(self.dao.get_preset_by_name("x' OR name <> '")), [])
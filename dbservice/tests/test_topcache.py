@@ -0,0 +1,25 @@
+import unittest
+from datetime import datetime, timezone
+
+from dbprovider.topcache import TopCache
+
+
+class TopCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = TopCache(engine=None, size=10, rounding=60)
+
+    def test_window_start_rounded_up(self):
+        after = datetime(2021, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+        self.assertEqual(self.cache.round_after(after), datetime(2021, 2, 3, 4, 6, tzinfo=timezone.utc))
+        rounded = datetime(2021, 2, 3, 4, 6, tzinfo=timezone.utc)
+        self.assertEqual(self.cache.round_after(rounded), rounded)
+
+    def test_stale_generation_not_cached(self):
+        generation = self.cache.generation
+        self.cache.invalidate()
+        self.cache.put("key", [1], generation)
+        self.assertIsNone(self.cache.get("key"))
+
+        self.cache.put("key", [1], self.cache.generation)
+        self.assertEqual(self.cache.get("key"), [1])
+        self.assertEqual(self.cache.stats()["hits"], 1)
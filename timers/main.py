@@ -3,96 +3,80 @@ import json
 from datetime import datetime, timedelta
 import time
 from logging import Logger
-import requests as r
 from influxdb_client import Point
 
 from common.models import Timer
 
 from config import OVERDUE_MINUTES, LOG_LEVEL
+from common.DBClient import DBClient, ServiceClient
 from common.LoggerFactory import create_logger
-from common.extras import TimerEncoder, try_request
-from config import INFLUX_API_WRITE
+from config import INFLUX_API_WRITE, INFLUX_API_COUNT
 
 
 async def update_timers_once(
-        logger: Logger, ui_service: str, db_service: str
+        logger: Logger, ui_service: ServiceClient, db_service: DBClient
 ):
     """
     Updates timers that are older than N minutes ago and send user a message about it
     """
-    db_base_url = f"http://{db_service}/timer/"
-    ui_base_url = f"http://{ui_service}/internal/"
 
     # get timers older than n_minutes
-    time_border = (datetime.utcnow() - timedelta(minutes=OVERDUE_MINUTES)).isoformat()
+    time_border = datetime.utcnow() - timedelta(minutes=OVERDUE_MINUTES)
 
-    overdue_timers = (try_request(logger, r.get, db_base_url + "overdue", params={"time_border": time_border})
-                      .map_or([], lambda x: x.json()))
+    overdue_timers = (await db_service.get_overdue_timers(time_border)).map_or([], lambda x: x)
     INFLUX_API_WRITE(Point("digestbot").field("overdue_timers", len(overdue_timers)).time(datetime.utcnow()))
 
     # update each timer and notify the timer creator
     now = datetime.utcnow()
     for timer in overdue_timers:
-        new_start = datetime.fromisoformat(timer['next_start'])
-        delta = timedelta(seconds=timer['delta'])
+        new_start = timer.next_start
 
         # update time with deltas
         while new_start < now:
-            new_start += delta
-
-        new_timer = Timer(
-            channel_id=timer['channel_id'],
-            username=timer['username'],
-            timer_name=timer['timer_name'],
-            delta=delta,
-            next_start=new_start,
-            top_command=timer['top_command'],
-        )
+            new_start += timer.delta
+
+        new_timer = timer.copy(update={"next_start": new_start})
 
         # update timer in DB and notify the user
-        try_request(logger, r.patch, db_base_url + "next_start", data=json.dumps(new_timer.dict(), cls=TimerEncoder))
+        await db_service.update_timer_next_start(new_timer)
 
         text = f"""Due to bot being offline or other reasons timer {new_timer.timer_name} 
         of user <@{new_timer.username}> missed it's tick. 
         Timer's new next start is: {new_timer.next_start.strftime('%Y-%m-%d %H:%M:%S')}."""
-        try_request(logger, r.post, ui_base_url + "message",
-                    data=json.dumps({"channel_id": new_timer.channel_id, "text": text}))
+        await ui_service.request(
+            "POST", "internal/message", body={"channel_id": new_timer.channel_id, "text": text}
+        )
 
     logger.debug(f"{len(overdue_timers)} overdue timers updated.")
 
 
-async def report_statistics(logger: Logger, db_service: str):
-    db_base_url = f"http://{db_service}/timer/count"
-    timers_total = try_request(logger, r.get, db_base_url).map(lambda x: x.json())
+async def report_statistics(logger: Logger, db_service: DBClient):
+    timers_total = await db_service.count_timers()
     if timers_total.is_ok():
         INFLUX_API_WRITE(Point("digestbot").field("timers_total", timers_total.unwrap()).time(datetime.utcnow()))
 
 
-async def update_timers(logger: Logger, ui_service: str, db_service: str):
+async def update_timers(logger: Logger, ui_service: ServiceClient, db_service: DBClient):
     while True:
         await update_timers_once(logger=logger, ui_service=ui_service, db_service=db_service)
         await report_statistics(logger=logger, db_service=db_service)
         await asyncio.sleep(OVERDUE_MINUTES * 60)
 
 
-async def process_timers(logger: Logger, ui_service: str, db_service: str):
-    db_base_url = f"http://{db_service}/timer/"
-    ui_base_url = f"http://{ui_service}/internal/"
-
+async def process_timers(logger: Logger, ui_service: ServiceClient, db_service: DBClient):
     while True:
-        time_border = (datetime.utcnow() - timedelta(minutes=OVERDUE_MINUTES)).isoformat()
+        time_border = datetime.utcnow() - timedelta(minutes=OVERDUE_MINUTES)
 
         # get nearest timer to execute
-        answer = try_request(logger, r.get, db_base_url + "nearest", params={"time_border": time_border}).map(
-            lambda x: x.json())
+        answer = await db_service.get_nearest_timer(time_border)
         if answer.is_err() or answer.value is None:
             await asyncio.sleep(300)
             continue
-        nearest_timer: dict = answer.value
+        nearest_timer: Timer = answer.value
 
         # sleep until that time if time - current_time > 0
 
-        run_time = datetime.fromisoformat(nearest_timer['next_start'])
+        run_time = nearest_timer.next_start
         now = datetime.utcnow()
         run_delta = run_time - now
         run_delta = run_delta.total_seconds()
@@ -103,33 +87,23 @@ async def process_timers(logger: Logger, ui_service: str, db_service: str):
             continue  # let's get timer again just in case if user deleted it already
 
         # run top command and return result to the user
-        request_parameters = json.loads(nearest_timer['top_command'])
+        request_parameters = json.loads(nearest_timer.top_command)
         message_period = timedelta(seconds=request_parameters['message_period_seconds'])
-        after_ts = str(time.mktime((datetime.utcnow() - message_period).timetuple()))
-        request_parameters['after_ts'] = after_ts
+        request_parameters['after'] = (datetime.utcnow() - message_period).isoformat()  # UTC
 
-        next_time = datetime.fromisoformat(nearest_timer['next_start']) + timedelta(seconds=nearest_timer['delta'])
+        next_time = nearest_timer.next_start + nearest_timer.delta
         request_parameters['next_time'] = next_time
-        request_parameters['user_id'] = nearest_timer['username']
+        request_parameters['user_id'] = nearest_timer.username
 
         # post top request
-        try_request(
-            logger, r.post, ui_base_url + "top",
-            data=json.dumps({"channel_id": nearest_timer['channel_id'], "request_parameters": request_parameters},
-                            cls=TimerEncoder)
-        )
-
-        new_timer = Timer(
-            channel_id=nearest_timer['channel_id'],
-            username=nearest_timer['username'],
-            timer_name=nearest_timer['timer_name'],
-            delta=nearest_timer['delta'],
-            next_start=next_time,
-            top_command=nearest_timer['top_command'],
+        await ui_service.request(
+            "POST", "internal/top",
+            body={"channel_id": nearest_timer.channel_id, "request_parameters": request_parameters}
         )
 
-        try_request(logger, r.patch, db_base_url + "next_start", data=json.dumps(new_timer.dict(), cls=TimerEncoder))
-        INFLUX_API_WRITE(Point("digestbot").field("timers_processed", 1).time(datetime.utcnow()))
+        new_timer = nearest_timer.copy(update={"next_start": next_time})
+        await db_service.update_timer_next_start(new_timer)
+        INFLUX_API_COUNT("digestbot", "timers_processed")
 
 
 if __name__ == '__main__':
@@ -137,10 +111,12 @@ if __name__ == '__main__':
     DB_SERVICE = "dbservice:80"
 
     _logger = create_logger(__name__, LOG_LEVEL)
+    ui_client = ServiceClient(service_url=UI_SERVICE, logger=_logger)
+    db_client = DBClient(db_url=DB_SERVICE, logger=_logger)
 
     loop = asyncio.get_event_loop()
-    process_timers_task = loop.create_task(process_timers(_logger, UI_SERVICE, DB_SERVICE))
-    update_timers_task = loop.create_task(update_timers(_logger, UI_SERVICE, DB_SERVICE))
+    process_timers_task = loop.create_task(process_timers(_logger, ui_client, db_client))
+    update_timers_task = loop.create_task(update_timers(_logger, ui_client, db_client))
 
     _logger.info("Wait for 15 seconds to allow DB services to start...")
     time.sleep(15)
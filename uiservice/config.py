@@ -2,8 +2,13 @@
 Parse configuration variables from env vars and raise Exceptions if needed
 """
 
+import logging
+import os
+from common.LoggerFactory import create_logger as _create_logger
 from common.config import *
 
+_logger = _create_logger(__name__, logging.WARNING)
+
 SIGNING_SECRET = os.getenv("SIGNING_SECRET", None)
 if SIGNING_SECRET is None:
     raise Exception("SIGNING_SECRET is not provided.")
@@ -22,6 +27,45 @@ if SLACK_BOT_TOKEN is None:
 PM_ONLY = os.getenv("PM_ONLY", "False").strip().lower()
 PM_ONLY = PM_ONLY == "true"
 
+# Whether to update message statistics from Events API (message, thread and reaction events of public channels)
+EVENT_INGESTION = os.getenv("EVENT_INGESTION", "False").strip().lower()
+EVENT_INGESTION = EVENT_INGESTION == "true"
+
+# How long (in seconds) the channel list is served from memory before it's refreshed from Slack
+CHANNELS_TTL = os.getenv("CHANNELS_TTL", "300")
+try:
+    CHANNELS_TTL = int(CHANNELS_TTL)
+    if CHANNELS_TTL < 1:
+        raise ValueError
+except ValueError:
+    _logger.warning(
+        f"Could not parse channels TTL: {CHANNELS_TTL}, default value 300 seconds is used."
+    )
+    CHANNELS_TTL = 300
+
+# How many user profiles (timezones etc) to keep in memory and for how long (in seconds)
+USER_CACHE_SIZE = os.getenv("USER_CACHE_SIZE", "1000")
+try:
+    USER_CACHE_SIZE = int(USER_CACHE_SIZE)
+except ValueError:
+    _logger.warning(
+        f"Could not parse user cache size: {USER_CACHE_SIZE}, default value 1000 is used."
+    )
+    USER_CACHE_SIZE = 1000
+
+USER_CACHE_TTL = os.getenv("USER_CACHE_TTL", "3600")
+try:
+    USER_CACHE_TTL = int(USER_CACHE_TTL)
+except ValueError:
+    _logger.warning(
+        f"Could not parse user cache TTL: {USER_CACHE_TTL}, default value 3600 seconds is used."
+    )
+    USER_CACHE_TTL = 3600
+
+# Whether to fill user cache with all workspace members on startup
+USERS_PREFETCH = os.getenv("USERS_PREFETCH", "False").strip().lower()
+USERS_PREFETCH = USERS_PREFETCH == "true"
+
 # App name in slack (important for not answering own messages)
 BOT_NAME = os.getenv("BOT_NAME", "digestbot")
 
@@ -1,7 +1,11 @@
 from common.Slacker import Slacker
+from common.DBClient import DBClient
+from common.ChannelDirectory import ChannelDirectory
 from jinja2 import Environment
 from logging import Logger
 
 slacker: Slacker
+db: DBClient
+channels: ChannelDirectory
 jinja_env: Environment
 logger: Logger
@@ -3,7 +3,6 @@ from datetime import datetime, timezone
 import hashlib
 import hmac
 from typing import Optional, List, Any
-import requests as r
 
 from fastapi import HTTPException, Request
 from pydantic import ValidationError
@@ -12,6 +11,7 @@ from result import Result
 import config
 import container
 from common.extras import try_request
+from common.models import Preset
 from json_types import QnAAnswer
 
 
@@ -47,25 +47,20 @@ def process_url_verification(data: dict) -> dict:
     return {"challenge": data.get("challenge", None)}
 
 
-def get_user_presets(user_id: str) -> Optional[List]:
+async def get_user_presets(user_id: str) -> Optional[List[Preset]]:
     # get presets available for the user
-    return try_request(
-        container.logger,
-        r.get,
-        f"http://{config.DB_URL}/preset/",
-        params={'user_id': user_id, 'include_global': "true"}
-    ).map(lambda x: x.json()).value
+    return (await container.db.get_presets(user_id=user_id, include_global=True)).ok()
 
 
 async def get_user_channels_and_presets(user_id: str) -> Optional[List]:
-    presets_list = get_user_presets(user_id)
+    presets_list = await get_user_presets(user_id)
     if presets_list is None:
         return None
 
-    sources = [(y := x.get("name", "<ERROR>"), y.lower()) for x in presets_list]
+    sources = [(y := x.name, y.lower()) for x in presets_list]
 
     # extend them with current existing channels
-    channels = await container.slacker.get_channels_list()
+    channels = await container.channels.get_channels()
     if channels:
         sources.extend((y, f"<#{x}>") for x, y in channels)
     return sources
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import urllib.parse
@@ -18,7 +19,9 @@ from jinja2 import Environment, PackageLoader
 import config
 from common.LoggerFactory import create_logger
 from common.Slacker import Slacker
-from routers import request_parser, top, timer, preset, internal, qna, ignore
+from common.DBClient import DBClient
+from common.ChannelDirectory import ChannelDirectory
+from routers import request_parser, top, timer, preset, internal, qna, ignore, ingestion
 import extras
 import container
 
@@ -34,8 +37,15 @@ async def events(tasks: BackgroundTasks, data: dict = Body(...)):
     if extras.check_url_verification(data):
         return extras.process_url_verification(data)
 
+    # update statistics of channel messages right away instead of waiting for the crawler
+    ingested = config.EVENT_INGESTION and ingestion.ingestion_eligibility(data)
+    if ingested:
+        tasks.add_task(ingestion.ingest_event, data)
+
     # check if it is callback of message
     if not extras.check_message_callback(data):
+        if ingested:
+            return
         container.logger.error(f"Unknown payload: {data}")
         raise HTTPException(status_code=501, detail="Currently only callbacks of messages are processed.",
                             headers={'X-Slack-No-Retry': '1'})
@@ -131,9 +141,17 @@ async def startup():
         user_token=config.SLACK_USER_TOKEN,
         bot_token=config.SLACK_BOT_TOKEN,
         logger=container.logger,
-        async_init=True
+        async_init=True,
+        user_cache_size=config.USER_CACHE_SIZE,
+        user_cache_ttl=config.USER_CACHE_TTL,
+        base_url=config.SLACK_API_URL
     )
     await container.slacker.__ainit__(bot_token=config.SLACK_BOT_TOKEN)
+    container.db = DBClient(db_url=config.DB_URL, logger=container.logger)
+    container.channels = ChannelDirectory(slacker=container.slacker, logger=container.logger, ttl=config.CHANNELS_TTL)
+    container.channels.start()
+    if config.USERS_PREFETCH:
+        asyncio.create_task(container.slacker.prefetch_users())
 
     container.jinja_env = Environment(
         loader=PackageLoader(os.path.basename(os.path.dirname(__file__)), 'resources'),
@@ -141,5 +159,11 @@ async def startup():
     )
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await container.channels.stop()
+    await container.db.close()
+
+
 if __name__ == '__main__':
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,8 +1,5 @@
-from datetime import datetime
-from influxdb_client import Point
-
 import container
-from config import INFLUX_API_WRITE, QNA_PRESENTED
+from config import INFLUX_API_COUNT, QNA_PRESENTED
 
 
 def general_help() -> str:
@@ -77,4 +74,4 @@ async def process_message(channel_id: str, text: str):
         help_answer = {"text": qna_help()}
 
     await container.slacker.post_to_channel(channel_id=channel_id, **help_answer)
-    INFLUX_API_WRITE(Point("digestbot").field("help_requested", 1).time(datetime.utcnow()))
+    INFLUX_API_COUNT("digestbot", "help_requested")
@@ -0,0 +1,91 @@
+from common.models import Message, MessageDelta
+from common.utils import reaction_ranking
+from common.utils.cache import LRUCache
+
+import container
+
+# the same messages are stored by the crawler
+ALLOWED_SUBTYPES = {"thread_broadcast", "bot_message", "file_share", None}
+REACTION_EVENTS = {"reaction_added", "reaction_removed"}
+
+# Slack retries events that weren't acknowledged in time, they shouldn't be counted twice
+__seen_events = LRUCache(maxsize=10000)
+
+
+def ingestion_eligibility(data: dict) -> bool:
+    if data.get("type", None) != "event_callback":
+        return False
+
+    event = data.get("event", {})
+    if event.get("type", None) in REACTION_EVENTS:
+        return event.get("item", {}).get("type", None) == "message"
+
+    # only public channels are crawled
+    return event.get("type", None) == "message" and event.get("channel_type", None) == "channel"
+
+
+def __message_to_stored(event: dict) -> Message:
+    return Message(
+        username=event.get("user", "") or event.get("username", ""),
+        timestamp=event["ts"],
+        channel_id=event["channel"],
+        reply_count=0,
+        reply_users_count=0,
+        thread_length=len(event.get("text", "")),
+        reactions_rate=0.0,
+        link=None,
+        thread_ts=event["thread_ts"] if event.get("thread_ts", event["ts"]) != event["ts"] else None,
+    )
+
+
+async def ingest_event(data: dict) -> None:
+    """
+    Turn Slack event into incremental update of message statistics in dbservice
+    """
+    event_id = data.get("event_id", None)
+    if event_id is not None:
+        if event_id in __seen_events:
+            return
+        __seen_events.put(event_id, True)
+
+    event = data.get("event", {})
+    event_type = event.get("type", None)
+    subtype = event.get("subtype", None)
+
+    new_messages = []
+    deltas = []
+    if event_type in REACTION_EVENTS:
+        item = event.get("item", {})
+        score = reaction_ranking.get_react_score([{"name": event.get("reaction", ""), "count": 1}])
+        deltas.append(MessageDelta(
+            channel_id=item.get("channel", ""),
+            timestamp=item.get("ts", ""),
+            reactions_rate=score if event_type == "reaction_added" else -score,
+        ))
+    elif subtype == "message_replied":
+        parent = event.get("message", {})
+        deltas.append(MessageDelta(
+            channel_id=event.get("channel", ""),
+            timestamp=parent.get("ts", ""),
+            reply_users_count=parent.get("reply_users_count", None),
+        ))
+    elif subtype in ALLOWED_SUBTYPES and "ts" in event:
+        thread_ts = event.get("thread_ts", None)
+        if thread_ts is not None and thread_ts != event["ts"]:
+            deltas.append(MessageDelta(
+                channel_id=event.get("channel", ""),
+                timestamp=thread_ts,
+                reply_count=1,
+                thread_length=len(event.get("text", "")),
+            ))
+        if thread_ts is None or thread_ts == event["ts"] or subtype == "thread_broadcast":
+            new_messages.append(__message_to_stored(event))
+
+    if new_messages:
+        answer = await container.db.insert_event_messages(new_messages)
+        if answer.is_err():
+            container.logger.warning(f"Couldn't store messages from event: {event}")
+    if deltas:
+        answer = await container.db.apply_message_deltas(deltas)
+        if answer.is_err():
+            container.logger.warning(f"Couldn't apply message statistics from event: {event}")
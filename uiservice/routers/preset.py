@@ -1,15 +1,10 @@
-import json
 from datetime import datetime
 
 from influxdb_client import Point
 
-import config
-import requests as r
-
 import container
 
-from common.extras import try_request
-from config import INFLUX_API_WRITE
+from config import INFLUX_API_WRITE, INFLUX_API_COUNT
 
 PRESET_OVERRIDE_WARNING_MESSAGE = "Your preset name is the same as global preset. It will override global preset."
 PRESET_ALREADY_EXISTS = "Preset already exists. Please, delete existing preset or choose another name (wisely)."
@@ -29,14 +24,12 @@ PRESET_NOT_CREATED = "Couldn't create preset {0}, some error occurred. Sorry :("
 
 
 async def send_initial_message(user_id: str, channel_id: str) -> None:
-    base_url = f"http://{config.DB_URL}/preset/"
-    answer = try_request(container.logger, r.get, base_url, params={"user_id": user_id, "include_global": False})
+    answer = await container.db.get_presets(user_id=user_id, include_global=False)
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=channel_id, text=answer.unwrap_err())
         return
-    answer = answer.unwrap()
 
-    presets = answer.json()
+    presets = [x.dict() for x in answer.unwrap()]
     for x in presets:
         x['text_channel_ids'] = ", ".join(f"<#{c}>" for c in x.get('channel_ids'))
 
@@ -67,7 +60,7 @@ async def preset_interaction(data: dict):
     else:
         container.logger.warning(f"Unknown preset interaction message: {data}")
 
-    preset_count = try_request(container.logger, r.get, f"http://{config.DB_URL}/preset/count").map(lambda x: x.json())
+    preset_count = await container.db.count_presets()
     if preset_count.is_ok():
         INFLUX_API_WRITE(Point("digestbot").field("presets_total", preset_count.unwrap()).time(datetime.utcnow()))
 
@@ -81,13 +74,12 @@ async def __show_preset_creation(data: dict):
 
 async def __process_preset_deletion(data: dict, channel_id: str, user_id: str):
     preset_name = data.get("actions", [{}])[0].get("value", "")
-    base_url = f"http://{config.DB_URL}/preset/"
 
     if preset_name is None:
         await container.slacker.post_to_channel(channel_id=channel_id, text=PRESET_NOT_SPECIFIED)
         return
 
-    answer = try_request(container.logger, r.delete, base_url, params={'name': preset_name, 'user_id': user_id})
+    answer = await container.db.delete_preset(user_id=user_id, name=preset_name)
     if answer.is_ok():
         text = PRESET_DELETED.format(preset_name)
     else:
@@ -96,21 +88,19 @@ async def __process_preset_deletion(data: dict, channel_id: str, user_id: str):
 
 
 async def __process_preset_creation(data: dict, user_id: str):
-    base_url = f"http://{config.DB_URL}/preset/"
-
     # get preset name and channels
     data = data.get("view", {}).get("state", {}).get("values", {})
     preset_name = data.get("preset_name", {}).get("title", {}).get("value", "")
     channels = data.get("channels_selector", {}).get("channels", {}).get("selected_channels", [])
 
     # check that preset_name does not exist and channels are not empty
-    answer = try_request(container.logger, r.get, base_url, params={"user_id": user_id, "include_global": False})
+    answer = await container.db.get_presets(user_id=user_id, include_global=False)
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=user_id, text=DATABASE_INTERACTION_ERROR)
         return
     answer = answer.unwrap()
 
-    if preset_name in {x.get("name", "") for x in answer.json()}:
+    if preset_name in {x.name for x in answer}:
         await container.slacker.post_to_channel(channel_id=user_id, text=PRESET_ALREADY_EXISTS)
         return
 
@@ -119,22 +109,21 @@ async def __process_preset_creation(data: dict, user_id: str):
         return
 
     # check whether user will override global presets
-    answer = try_request(container.logger, r.get, base_url, params={"include_global": True})
+    answer = await container.db.get_presets(include_global=True)
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=user_id, text=DATABASE_INTERACTION_ERROR)
         return
     answer = answer.unwrap()
 
     user_answer = ""
-    if preset_name in {x.get("name", "") for x in answer.json()}:
+    if preset_name in {x.name for x in answer}:
         user_answer += PRESET_OVERRIDE_WARNING_MESSAGE
         user_answer += "\n"
 
-    answer = try_request(container.logger, r.put, base_url, params={'user_id': user_id, 'name': preset_name},
-                         data=json.dumps(channels))
+    answer = await container.db.add_or_update_preset(user_id=user_id, name=preset_name, channels=channels)
     if answer.is_ok():
         user_answer += PRESET_CREATED.format(preset_name)
-        INFLUX_API_WRITE(Point("digestbot").field("preset_created", 1).time(datetime.utcnow()))
+        INFLUX_API_COUNT("digestbot", "preset_created")
     else:
         user_answer += PRESET_NOT_CREATED.format(preset_name)
 
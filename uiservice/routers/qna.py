@@ -2,12 +2,11 @@ from datetime import datetime, timedelta
 
 import requests as r
 from fastapi import Response, BackgroundTasks
-from influxdb_client import Point
 from result import Result
 
 import config
 import container
-from config import INFLUX_API_WRITE
+from config import INFLUX_API_COUNT
 from extras import try_request, check_qna_answer, transform_to_permalinks_or_text
 
 QNA_ERROR = "Received error during interaction with Q&A app. Please, try later or contact with ODS.ai Q&A team."
@@ -63,7 +62,7 @@ async def qna_interaction(data: dict):
     answer = answer.unwrap()
 
     # collect metric
-    INFLUX_API_WRITE(Point("digestbot").field("qna_request", 1).time(datetime.utcnow()))
+    INFLUX_API_COUNT("digestbot", "qna_request")
 
     # for each message get either preview or message text and then construct a final message
     blocks = await transform_to_permalinks_or_text(answer)
@@ -1,9 +1,5 @@
-from datetime import datetime
-
-from influxdb_client import Point
-
 import container
-from config import INFLUX_API_WRITE, QNA_PRESENTED
+from config import INFLUX_API_COUNT, QNA_PRESENTED
 from . import top, timer, preset, helper, qna, ignore
 
 
@@ -23,7 +19,7 @@ async def process_message(message: dict) -> None:
     user_id = message.get("user", "")
     channel = message.get("channel", "")
 
-    INFLUX_API_WRITE(Point("digestbot").field("overall_requests", 1).time(datetime.utcnow()))
+    INFLUX_API_COUNT("digestbot", "overall_requests")
 
     if text.startswith("help"):
         await helper.process_message(channel, text)
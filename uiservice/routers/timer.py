@@ -2,18 +2,14 @@ import json
 import uuid
 from datetime import datetime, timedelta
 
-from influxdb_client import Point
 
-import config
 import container
-import requests as r
 from result import Result, Ok, Err
 from sentry_sdk import capture_message
 
 from common.models import Timer
-from config import INFLUX_API_WRITE
+from config import INFLUX_API_COUNT
 from extras import get_user_channels_and_presets
-from common.extras import try_request, TimerEncoder
 from routers.top import top_parser
 
 DATABASE_INTERACTION_ERROR = "Received error during database interaction. Please, try later."
@@ -41,23 +37,13 @@ PRESETS_NOT_RECEIVED = "Couldn't receive presets for the user. Please, contact b
 
 
 async def send_initial_message(user_id: str, channel_id: str) -> None:
-    base_url = f"http://{config.DB_URL}/timer/"
-    answer = try_request(container.logger, r.get, base_url, params={"username": user_id})
+    answer = await container.db.list_timers(username=user_id)
 
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=channel_id, text=DATABASE_INTERACTION_ERROR)
         return
-    answer = answer.unwrap()
-
-    timers = answer.json()
-    timers = [Timer(
-        channel_id=x['channel_id'],
-        username=x['username'],
-        timer_name=x['timer_name'],
-        delta=timedelta(seconds=x['delta']),
-        next_start=datetime.fromisoformat(x['next_start']),
-        top_command=x['top_command']
-    ) for x in timers]
+
+    timers = answer.unwrap()
 
     template = container.jinja_env.get_template("timer_list.json")
     result = template.render(timers=timers)
@@ -154,13 +140,12 @@ async def __process_timer_creation(data: dict, channel_id: str, user_id: str):
         top_command=json.dumps(timer_parameters)
     )
 
-    data = json.dumps(new_timer.dict(), cls=TimerEncoder)
-    answer = try_request(container.logger, r.post, f"http://{config.DB_URL}/timer/", data=data)
+    answer = await container.db.insert_timer(new_timer)
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=channel_id, text=TIMER_CREATION_FAILED)
         return
 
-    INFLUX_API_WRITE(Point("digestbot").field("timer_created", 1).time(datetime.utcnow()))
+    INFLUX_API_COUNT("digestbot", "timer_created")
     await container.slacker.post_to_channel(
         channel_id=channel_id,
         text=TIMER_CREATED.format(new_timer.timer_name, new_timer.next_start.isoformat())
@@ -170,24 +155,22 @@ async def __process_timer_creation(data: dict, channel_id: str, user_id: str):
 
 async def __process_timer_deletion(data: dict, channel_id: str, user_id: str):
     timer_name = data['actions'][0]['value']
-    base_url = f"http://{config.DB_URL}/timer/"
 
     if not timer_name:
         await container.slacker.post_to_channel(channel_id=channel_id, text=TIMER_NAME_NOT_SPECIFIED)
         return
 
-    answer = try_request(container.logger, r.get, base_url + "exists",
-                         params={'timer_name': timer_name, 'username': user_id})
+    answer = await container.db.check_timer_existence(username=user_id, timer_name=timer_name)
 
     if answer.is_err():
         await container.slacker.post_to_channel(channel_id=channel_id, text=INTERNAL_ERROR)
         return
 
-    if not answer.unwrap().json():
+    if not answer.unwrap():
         await container.slacker.post_to_channel(channel_id=channel_id, text=TIMER_NOT_FOUND)
         return
 
-    answer = try_request(container.logger, r.delete, base_url, params={'timer_name': timer_name, 'username': user_id})
+    answer = await container.db.remove_timer(username=user_id, timer_name=timer_name)
     if answer.is_ok():
         text = TIMER_DELETED
     else:
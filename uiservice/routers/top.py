@@ -1,13 +1,12 @@
-import time
 from datetime import datetime, timedelta
 from typing import List, Generator, Any
 
-import requests as r
 from influxdb_client import Point
 from result import Result, Ok, Err
 
 import config
-from common.extras import try_parse_int, try_request
+from common.extras import try_parse_int
+from common.models import Message
 from extras import get_user_channels_and_presets
 import container
 
@@ -23,7 +22,7 @@ NO_MESSAGES_TO_PRINT = (
 )
 
 
-def __pretty_top_format(messages: List[dict]) -> Generator[str, Any, None]:
+def __pretty_top_format(messages: List[Message]) -> Generator[str, Any, None]:
     template = (
         "{}. <@{}> | <#{}>\n"
         "Replies: {} from {} users. Reactions rate: {}.\n"
@@ -32,12 +31,12 @@ def __pretty_top_format(messages: List[dict]) -> Generator[str, Any, None]:
     messages = (
         template.format(
             i,
-            x['username'],
-            x['channel_id'],
-            x['reply_count'],
-            x['reply_users_count'],
-            round(x['reactions_rate'], 2),
-            x['link'],
+            x.username,
+            x.channel_id,
+            x.reply_count,
+            x.reply_users_count,
+            round(x.reactions_rate, 2),
+            x.link,
         )
         for i, x in enumerate(messages, start=1)
     )
@@ -140,23 +139,22 @@ async def top_interaction(data: dict):
         await container.slacker.post_to_channel(channel_id=channel, text=TOP_FUTURE_ERROR)
         return
 
-    request_parameters['after_ts'] = str(time.mktime(selected_datetime.timetuple()))
+    request_parameters['after'] = selected_datetime.isoformat()  # UTC
 
     await post_top_message(channel_id=channel, request_parameters=request_parameters)
 
 
 async def post_top_message(channel_id: str, request_parameters: dict):
-    base_url = f"http://{config.DB_URL}/message/top"
-    answer = try_request(container.logger, r.get, base_url, params=request_parameters)
+    answer = await container.db.get_top_messages(request_parameters)
 
     if answer.is_err():
         answer = [MESSAGE_HANDLING_ERROR]
-    elif not (y := answer.unwrap().json()):
+    elif not (y := answer.unwrap()):
         answer = [NO_MESSAGES_TO_PRINT]
     else:
         config.INFLUX_API_WRITE(Point("digestbot").field("top_answers_returned", len(y)).time(datetime.utcnow()))
         answer = __pretty_top_format(y)
 
-    config.INFLUX_API_WRITE(Point("digestbot").field("top_requests", 1).time(datetime.utcnow()))
+    config.INFLUX_API_COUNT("digestbot", "top_requests")
     for message in answer:
         await container.slacker.post_to_channel(channel_id=channel_id, text=message)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# uiservice modules import each other as top-level modules (as in its container)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+from itertools import count
+from unittest.mock import MagicMock
+
+from result import Ok
+
+import container
+from common.utils import reaction_ranking
+from uiservice.routers import ingestion
+
+event_ids = count()
+
+
+class FakeDBClient:
+    def __init__(self):
+        self.messages = []
+        self.deltas = []
+
+    async def insert_event_messages(self, messages):
+        self.messages.extend(messages)
+        return Ok(None)
+
+    async def apply_message_deltas(self, deltas):
+        self.deltas.extend(deltas)
+        return Ok(None)
+
+
+class IngestionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        container.db = FakeDBClient()
+        container.logger = MagicMock()
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def ingest(self, event: dict, event_id: str = None) -> None:
+        data = {"type": "event_callback", "event_id": event_id or f"Ev{next(event_ids)}", "event": event}
+        self.loop.run_until_complete(ingestion.ingest_event(data))
+
+    def test_retried_event_counted_once(self):
+        item = {"type": "message", "channel": "C1", "ts": "1.0"}
+        event = {"type": "reaction_added", "reaction": "fire", "item": item}
+        self.ingest(event, event_id="EvRetried")
+        self.ingest(event, event_id="EvRetried")
+        self.assertEqual(len(container.db.deltas), 1)
+
+    def test_reactions_mapped_to_rate_deltas(self):
+        score = reaction_ranking.get_react_score([{"name": "fire", "count": 1}])
+        item = {"type": "message", "channel": "C1", "ts": "1.0"}
+        self.ingest({"type": "reaction_added", "reaction": "fire", "item": item})
+        self.ingest({"type": "reaction_removed", "reaction": "fire", "item": item})
+
+        self.assertEqual(
+            [(x.channel_id, x.timestamp, x.reactions_rate, x.reply_count) for x in container.db.deltas],
+            [("C1", "1.0", score, 0), ("C1", "1.0", -score, 0)]
+        )
+        self.assertEqual(container.db.messages, [])
+
+    def test_new_message_stored(self):
+        self.ingest({"type": "message", "channel": "C1", "user": "U1", "ts": "1.0", "text": "hello"})
+        self.assertEqual(
+            [(x.channel_id, x.timestamp, x.username, x.thread_length, x.thread_ts) for x in container.db.messages],
+            [("C1", "1.0", "U1", 5, None)]
+        )
+        self.assertEqual(container.db.deltas, [])
+
+    def test_reply_mapped_to_parent_delta(self):
+        self.ingest({"type": "message", "channel": "C1", "user": "U2", "ts": "2.0", "thread_ts": "1.0", "text": "re"})
+        self.assertEqual(
+            [(x.timestamp, x.reply_count, x.thread_length) for x in container.db.deltas],
+            [("1.0", 1, 2)]
+        )
+        self.assertEqual(container.db.messages, [])
+
+    def test_broadcast_reply_stored_and_counted(self):
+        self.ingest({
+            "type": "message", "subtype": "thread_broadcast", "channel": "C1", "user": "U2",
+            "ts": "2.0", "thread_ts": "1.0", "text": "re"
+        })
+        self.assertEqual([(x.timestamp, x.reply_count) for x in container.db.deltas], [("1.0", 1)])
+        self.assertEqual([(x.timestamp, x.thread_ts) for x in container.db.messages], [("2.0", "1.0")])
+
+    def test_reply_users_taken_from_parent(self):
+        self.ingest({
+            "type": "message", "subtype": "message_replied", "channel": "C1",
+            "message": {"ts": "1.0", "reply_users_count": 3}
+        })
+        self.assertEqual(
+            [(x.timestamp, x.reply_users_count, x.reply_count) for x in container.db.deltas],
+            [("1.0", 3, 0)]
+        )
+
+    def test_other_subtypes_ignored(self):
+        self.ingest({"type": "message", "subtype": "channel_join", "channel": "C1", "user": "U1", "ts": "1.0"})
+        self.assertEqual((container.db.messages, container.db.deltas), ([], []))